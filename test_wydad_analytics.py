@@ -0,0 +1,184 @@
+"""Contrôles de non-régression des calculs vectorisés de wydad_analytics
+
+Chaque calcul réécrit pour la performance est comparé à sa version directe en pandas :
+corrélations assemblées par cellule (face à .corr()), matrice de rétention (face à la boucle
+sur les ensembles de joueurs) et fusion incrémentale du snapshot (face à un chargement à froid).
+
+    python -m pytest -q
+"""
+import glob
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import wydad_analytics as analytics
+import wydad_benchmark as benchmark
+
+
+def copier_donnees(dossier):
+    """Copie les fichiers de saison réels de data/ dans un dossier temporaire et les charge"""
+    for chemin in glob.glob(os.path.join(analytics.DATA_DIR, analytics.SEASON_FILE_PATTERN)):
+        shutil.copy(chemin, dossier)
+    return analytics.charger(str(dossier))
+
+
+def generer(dossier):
+    """Génère et charge un jeu synthétique : 5 saisons de 2 clubs de 35 joueurs"""
+    benchmark.generer_donnees(str(dossier), 5, 35, 2)
+    return analytics.charger(str(dossier))
+
+
+@pytest.fixture(scope='module', params=['reelles', 'synthetiques'])
+def donnees(request, tmp_path_factory):
+    dossier = tmp_path_factory.mktemp(request.param)
+    df, rapport = copier_donnees(dossier) if request.param == 'reelles' else generer(dossier)
+    assert 'erreur' not in rapport
+    return df, analytics.construire_index(df)
+
+
+def test_pearson_par_cellules_egale_corr_pandas(donnees):
+    df, index = donnees
+    stats = analytics.construire_stats_correlation(df, index)
+    filtres = [(saison, position)
+               for saison in ['Toutes'] + sorted(df['Saison'].astype(str).unique())
+               for position in ['Toutes'] + sorted(df['Position'].astype(str).unique())]
+    for saison, position in filtres:
+        selection = analytics.filtrer_donnees(df, index, saison, position)
+        attendu = selection[stats['colonnes']].astype('float64').corr()
+        obtenu = analytics.correlation_pearson(stats, saison, position)
+        np.testing.assert_allclose(obtenu.to_numpy(), attendu.to_numpy(), rtol=0, atol=1e-9,
+                                   err_msg=f"{saison} × {position}")
+
+
+def test_retention_egale_boucle_sur_les_effectifs(donnees):
+    df, _ = donnees
+    retention = analytics.calculer_retention(df)
+    saisons = sorted(df['Saison'].astype(str).unique())
+    effectifs = [set(df.loc[df['Saison'].astype(str) == saison, 'ID_joueur']) for saison in saisons]
+    assert retention['saisons'] == saisons
+
+    transitions = retention['transitions']
+    for i in range(len(saisons) - 1):
+        s1, s2 = effectifs[i], effectifs[i + 1]
+        deja_vus = set().union(*effectifs[:i + 1])
+        ligne = transitions.iloc[i]
+        assert ligne['Saison'] == f"{saisons[i]} → {saisons[i + 1]}"
+        assert ligne['Joueurs Conservés'] == len(s1 & s2)
+        assert ligne['Effectif Saison N'] == len(s1)
+        assert ligne['Arrivées'] == len(s2 - s1)
+        assert ligne['Départs'] == len(s1 - s2)
+        assert ligne['Retours'] == len((s2 - s1) & deja_vus)
+        assert ligne['Taux de Rétention (%)'] == pytest.approx(len(s1 & s2) / len(s1) * 100)
+
+    matrice = retention['matrice'].to_numpy()
+    for i, j in np.ndindex(matrice.shape):
+        if j <= i:
+            assert np.isnan(matrice[i, j])
+        else:
+            attendu = len(effectifs[i] & effectifs[j]) / len(effectifs[i]) * 100
+            assert matrice[i, j] == pytest.approx(attendu)
+
+
+def test_saisons_sous_le_seuil_de_minutes_non_classees(donnees):
+    df, index = donnees
+    cohortes = analytics.construire_cohortes(df, index)
+    lignes = {ligne: cle for cle, ligne in cohortes['lignes'].items()}
+    minutes = df['Minutes jouées'].to_numpy()
+    courte = lignes[int(np.flatnonzero(minutes < analytics.MINUTES_MIN_COHORTE)[0])]
+    longue = lignes[int(np.flatnonzero(minutes >= analytics.MINUTES_MIN_COHORTE)[0])]
+    comparaison = analytics.comparer_joueurs(df, cohortes, [courte, longue])
+    centiles = comparaison[[f"{m}_centile" for m in analytics.METRIQUES_COMPARAISON]]
+    assert centiles.iloc[0].isna().all()
+    assert comparaison['Référence'].iloc[0].startswith('Hors cohorte')
+    assert centiles.iloc[1].notna().any()
+
+    identifiant = courte[0]
+    saisons = sorted(df.loc[df['ID_joueur'] == identifiant, 'Saison'].astype(str).unique(), reverse=True)
+    choisie = saisons[analytics.saison_par_defaut(df, cohortes, identifiant, saisons)]
+    classables = [saison for saison in saisons
+                  if minutes[cohortes['lignes'][(identifiant, saison)]] >= analytics.MINUTES_MIN_COHORTE]
+    assert choisie == (classables[0] if classables else saisons[0])
+
+
+def test_snapshot_incremental_egal_chargement_a_froid(tmp_path, monkeypatch):
+    benchmark.generer_donnees(str(tmp_path), 4, 35, 1)
+    snapshot = analytics.chemin_snapshot(str(tmp_path))
+    analytics.charger(str(tmp_path))
+    assert os.path.exists(snapshot)
+
+    # Une saison modifiée (nouvelle valeur, nouveau mtime) et une saison ajoutée
+    modifie = tmp_path / 'Merged_WYDAD_201213.csv'
+    saison = pd.read_csv(modifie, encoding='utf-8')
+    saison.loc[0, 'Buts'] = saison.loc[0, 'Buts'] + 7
+    saison.to_csv(modifie, index=False, encoding='utf-8')
+    os.utime(modifie, ns=(os.stat(modifie).st_atime_ns, os.stat(modifie).st_mtime_ns + 10**9))
+    nouvelles = tmp_path / 'nouvelles'
+    nouvelles.mkdir()
+    benchmark.generer_donnees(str(nouvelles), 5, 35, 1, graine=1)
+    shutil.copy(nouvelles / 'Merged_WYDAD_201516.csv', tmp_path)
+
+    lus = []
+    lire_saison = analytics.lire_saison
+    monkeypatch.setattr(analytics, 'lire_saison',
+                        lambda base_path, file: lus.append(file) or lire_saison(base_path, file))
+    df_incremental, rapport_incremental = analytics.charger(str(tmp_path))
+    assert sorted(lus) == ['Merged_WYDAD_201213.csv', 'Merged_WYDAD_201516.csv']
+
+    os.remove(snapshot)
+    df_froid, rapport_froid = analytics.charger(str(tmp_path))
+    pd.testing.assert_frame_equal(df_incremental, df_froid)
+    pd.testing.assert_frame_equal(rapport_incremental['quarantaine'], rapport_froid['quarantaine'],
+                                  check_dtype=False)
+    assert rapport_incremental['version'] == rapport_froid['version']
+
+
+def test_identifiants_ne_fusionnent_pas_les_joueurs_generes(tmp_path):
+    # Noms numérotés ('Mourad El Kaabi 6'), tailles manquantes ('-') et âges proches : chaque
+    # joueur généré garde un identifiant à lui, et un seul
+    benchmark.generer_donnees(str(tmp_path), 8, 35, 10)
+    df, _ = analytics.charger(str(tmp_path))
+    joueurs = analytics.table_joueurs(df)
+    assert joueurs['Variantes'].map(len).max() == 1
+    assert len(joueurs) == df['Name'].nunique()
+
+
+def test_identifiants_variantes_et_homonymes():
+    df = pd.DataFrame({
+        'Saison': ['2015/16', '2015/16', '2016/17', '2016/17', '2016/17', '2017/18'],
+        'Name': ['Walid El Karti', 'Mourad El Kaabi', 'Walid El Karti 2', 'Walid El Kartie',
+                 'Mourad El Kaabi', 'Mourad El Kaabi'],
+        'Age': [24, 22, 25, 25, 23, 24],
+        'Taille': [1.80, 1.81, 1.80, 1.80, np.nan, 1.74],
+        'Position': ['Ailier droit', 'Arrière droit', 'Ailier droit', 'Ailier gauche',
+                     'Arrière droit', 'Ailier gauche'],
+    })
+    identifiants, _ = analytics.attribuer_identifiants(df)
+    karti, kaabi, homonyme, variante, kaabi_sans_taille, autre_kaabi = identifiants
+    # Variante d'écriture : même âge, même taille, même groupe de postes
+    assert variante == karti
+    # Nom complété d'un numéro : un autre joueur
+    assert homonyme not in (karti, kaabi)
+    # Une saison sans taille ne fait pas oublier la dernière taille connue
+    assert kaabi_sans_taille == kaabi
+    assert autre_kaabi != kaabi
+
+
+def test_table_des_identifiants_illisible_n_est_pas_ecrasee(tmp_path):
+    benchmark.generer_donnees(str(tmp_path), 3, 35, 1)
+    analytics.charger(str(tmp_path))
+    chemin = tmp_path / analytics.IDENTITES_FICHIER
+    table = pd.read_csv(chemin, dtype=str)
+    # Correction à la main en cours : un identifiant modifié, un autre effacé
+    table.loc[0, 'ID_joueur'] = '999'
+    table.loc[1, 'ID_joueur'] = ''
+    table.to_csv(chemin, index=False)
+    contenu = chemin.read_text()
+
+    df, rapport = analytics.charger(str(tmp_path))
+    assert [niveau for niveau, _ in rapport['alertes']] == ['error']
+    assert chemin.read_text() == contenu
+    ligne = (df['Saison'].astype(str) == table.loc[0, 'Saison']) & (df['Name'].astype(str) == table.loc[0, 'Name'])
+    assert (df.loc[ligne, 'ID_joueur'] == 999).all()
@@ -0,0 +1,1688 @@
+"""Analyses du Wydad AC, indépendantes de Streamlit
+
+Chargement des fichiers de saison, filtres et agrégats utilisés par le dashboard
+(wydad_app.py), sous forme de fonctions pures renvoyant des DataFrames. Le module
+peut être importé depuis un script, un notebook ou un traitement batch :
+
+    import wydad_analytics as analytics
+    df, rapport = analytics.charger()
+    analytics.top_buteurs(analytics.construire_cube(df))
+
+Les résultats partagés (DataFrame chargé, index, cube) ne doivent pas être modifiés ;
+la mise en cache est laissée à l'appelant.
+"""
+import pandas as pd
+import numpy as np
+import os
+import re
+import unicodedata
+import glob
+import json
+import hashlib
+import threading
+import time
+import argparse
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import wydad_instrumentation as instrumentation
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # pyarrow absent : lecture directe des CSV, sans snapshot
+    pa = None
+
+# Dossier des données et snapshot colonnaire (Arrow IPC) construit à partir des CSV
+DATA_DIR = 'data'
+# WYDAD_SNAPSHOT permet de placer le snapshot ailleurs (ex. /dev/shm pour le mode partagé)
+SNAPSHOT_PATH = os.environ.get('WYDAD_SNAPSHOT') or os.path.join(DATA_DIR, '.cache', 'wydad_snapshot.arrow')
+# Version du format du snapshot : à incrémenter dès que la préparation des données change
+SNAPSHOT_VERSION = 9
+# Mode partagé : les processus mappent le snapshot publié au lieu de lire les CSV
+DONNEES_PARTAGEES = os.environ.get('WYDAD_DONNEES_PARTAGEES', '') not in ('', '0')
+# Fichiers de saison : Merged_WYDAD_201112.csv -> saison 2011/12
+SEASON_FILE_PATTERN = 'Merged_WYDAD_*.csv'
+SEASON_FILE_REGEX = re.compile(r'^Merged_WYDAD_(\d{4})(\d{2})\.csv$')
+# Nombre de fichiers lus en parallèle (WYDAD_LOAD_WORKERS=1 pour une lecture séquentielle)
+LOAD_WORKERS = int(os.environ.get('WYDAD_LOAD_WORKERS', 0)) or min(8, os.cpu_count() or 1)
+
+# Schéma canonique des fichiers de saison, dans l'ordre des colonnes
+COLONNES_CANONIQUES = [
+    'Name', 'Taille', 'Pied', 'Date_signature', 'market_value', 'Position', 'Age',
+    "Dans l'effectif", 'Matchs', 'Buts', 'Passes décisives', 'Cartons Jaunes',
+    'Cartons rouges/jaunes', 'CartonS rouges', 'Entré en jeu', 'Remplacé', 'PPM',
+    'Minutes jouées', 'Saison'
+]
+# Variantes de noms de colonnes rencontrées dans les exports
+ALIAS_COLONNES = {
+    'Joueur': 'Name',
+    'Nom': 'Name',
+    'Valeur marchande': 'market_value',
+    'Cartons rouges': 'CartonS rouges',
+    'Minutes': 'Minutes jouées',
+}
+# Registre des décalages de colonnes connus, par saison (colonne du fichier -> colonne réelle).
+# Un décalage n'est réparé que si le contenu des colonnes le confirme (voir decalage_confirme).
+SCHEMAS_SAISONS = {
+    # Export 2024/25 : 'Taille' contient le pied préféré et 'Pied' la date de signature
+    '2024/25': {'Taille': 'Pied', 'Pied': 'Date_signature'},
+}
+# Valeurs du pied préféré dans les exports
+VALEURS_PIED = {'droit', 'gauche', 'les deux', 'ambidextre'}
+# Abréviations des mois en français ('27 janv. 2025')
+MOIS_FR = {
+    'janv': 1, 'janvier': 1, 'févr': 2, 'fevr': 2, 'février': 2, 'mars': 3, 'avr': 4, 'avril': 4,
+    'mai': 5, 'juin': 6, 'juil': 7, 'juillet': 7, 'août': 8, 'aout': 8, 'sept': 9, 'septembre': 9,
+    'oct': 10, 'octobre': 10, 'nov': 11, 'novembre': 11, 'déc': 12, 'dec': 12, 'décembre': 12
+}
+# Colonnes de comptage qui ne peuvent pas être négatives
+COLONNES_COMPTAGE = [
+    "Dans l'effectif", 'Matchs', 'Buts', 'Passes décisives', 'Cartons Jaunes',
+    'Cartons rouges/jaunes', 'CartonS rouges', 'Entré en jeu', 'Remplacé', 'Minutes jouées'
+]
+# Rapport d'ingestion : lignes écartées et colonnes ignorées
+COLONNES_QUARANTAINE = ['Fichier', 'Ligne', 'Name', 'Motif']
+# Schéma compact en mémoire : catégories pour les libellés, petits entiers pour les comptages
+COLONNES_CATEGORIES = ['Name', 'Position', 'Saison', 'Pied']
+COLONNES_ENTIERES = COLONNES_COMPTAGE + ['market_value', 'Contributions_offensives', 'Cartons_total']
+COLONNES_RATIOS = ['Age', 'Taille', 'PPM', 'Ratio_Buts_Matchs', 'Minutes_par_match']
+# Table persistante des identifiants joueurs : (ID_joueur, Saison, Name) pour chaque ligne ingérée
+IDENTITES_FICHIER = 'identites_joueurs.csv'
+COLONNES_IDENTITES = ['ID_joueur', 'Saison', 'Name']
+# Variantes d'écriture : similarité minimale des trigrammes, et saisons d'absence tolérées
+SEUIL_VARIANTE_NOM = 0.6
+ECART_VARIANTE_SAISONS = 2
+# Groupes de postes : cohortes de repli des centiles quand un poste compte trop peu de joueurs,
+# et cohérence de poste exigée pour rapprocher deux variantes d'écriture d'un nom
+GROUPES_POSTES = {
+    'Gardien de but': 'Gardiens',
+    'Défenseur central': 'Défenseurs', 'Arrière droit': 'Défenseurs', 'Arrière gauche': 'Défenseurs',
+    'Défense': 'Défenseurs',
+    'Milieu défensif': 'Milieux', 'Milieu central': 'Milieux', 'Milieu offensif': 'Milieux',
+    'Milieu droit': 'Milieux', 'Milieu gauche': 'Milieux', 'Milieu': 'Milieux',
+    'Ailier droit': 'Attaquants', 'Ailier gauche': 'Attaquants', 'Avant-centre': 'Attaquants',
+    'Deuxième attaquant': 'Attaquants', 'Attaquant': 'Attaquants',
+}
+
+
+def saison_du_fichier(file):
+    """Déduit la saison ('2011/12') du nom de fichier, ou None si le nom ne correspond pas"""
+    match = SEASON_FILE_REGEX.match(file)
+    return f"{match.group(1)}/{match.group(2)}" if match else None
+
+
+def signature_sources(base_path):
+    """Découvre les fichiers de saison et renvoie leur signature (nom, mtime, taille), triée par saison"""
+    signature = []
+    for file_path in sorted(glob.glob(os.path.join(base_path, SEASON_FILE_PATTERN))):
+        file = os.path.basename(file_path)
+        if saison_du_fichier(file) is None:
+            continue
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+        signature.append((file, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def signature_identites(base_path):
+    """Signature (mtime, taille) de la table des identifiants de base_path, ou None si elle est absente"""
+    try:
+        stat = os.stat(os.path.join(base_path, IDENTITES_FICHIER))
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def version_donnees(signature, identites=None):
+    """Identifiant court de la version du jeu de données, dérivé de la signature des sources
+    et de celle de la table des identifiants"""
+    return hashlib.sha1(json.dumps([signature, identites]).encode()).hexdigest()[:12]
+
+
+def chemin_snapshot(base_path):
+    """Chemin du snapshot associé à un dossier de données"""
+    if base_path == DATA_DIR:
+        return SNAPSHOT_PATH
+    return os.path.join(base_path, '.cache', os.path.basename(SNAPSHOT_PATH))
+
+
+def lire_snapshot(path):
+    """Mappe en mémoire le snapshot et renvoie (df, segments, rapport), ou None s'il est absent ou obsolète
+
+    Les segments associent chaque source (nom, mtime, taille) à sa plage de lignes dans le snapshot.
+    Les colonnes numériques sans valeur nulle Arrow pointent directement dans le fichier mappé
+    (sans copie, en lecture seule) : les processus qui mappent le même snapshot partagent ses pages.
+    """
+    if pa is None or not os.path.exists(path):
+        return None
+    try:
+        # Le mapping n'est pas fermé : il reste ouvert tant que les colonnes le référencent
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        meta = json.loads(table.schema.metadata[b'wydad'])
+    except Exception:
+        return None
+    if meta.get('version') != SNAPSHOT_VERSION:
+        return None
+    segments = {}
+    debut = 0
+    for source, nb_lignes in zip(meta['sources'], meta['lignes']):
+        segments[tuple(source)] = (debut, nb_lignes)
+        debut += nb_lignes
+    rapport = {
+        'quarantaine': pd.DataFrame(meta['quarantaine'], columns=COLONNES_QUARANTAINE),
+        'memoire': tuple(meta['memoire']),
+        # Signature de la table des identifiants appliquée aux lignes du snapshot
+        'identites': tuple(meta['identites']) if meta['identites'] is not None else None
+    }
+    return table.to_pandas(split_blocks=True), segments, rapport
+
+
+def ecrire_snapshot(df, path, signature, lignes, rapport):
+    """Écrit le snapshot de manière atomique (fichier temporaire puis renommage)"""
+    if pa is None:
+        return
+    quarantaine = rapport['quarantaine']
+    meta = json.dumps({
+        'version': SNAPSHOT_VERSION,
+        'sources': signature,
+        'lignes': lignes,
+        'quarantaine': quarantaine.astype(object).where(quarantaine.notna(), None).to_dict('records'),
+        'memoire': rapport['memoire'],
+        'identites': rapport['identites']
+    })
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), b'wydad': meta.encode()}
+    # Les NaN des colonnes flottantes restent des valeurs (pas de bitmap de validité) :
+    # la relecture peut alors exposer les buffers du fichier mappé sans copie
+    for i, champ in enumerate(table.schema):
+        if pa.types.is_floating(champ.type):
+            valeurs = pa.array(df[champ.name].to_numpy(), type=champ.type, from_pandas=False)
+            table = table.set_column(i, champ, valeurs)
+    table = table.replace_schema_metadata(metadata)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    except OSError:
+        # Dossier en lecture seule : on continue sans snapshot
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def convertir_nombre_fr(serie, dtype='float32'):
+    """Convertit une colonne au format français ('1,90', '1,85m', '-') en nombres, de manière vectorisée"""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(dtype)
+    nombres = (serie.astype('string')
+               .str.extract(r'(-?\d+(?:[.,]\d+)?)', expand=False)
+               .str.replace(',', '.', regex=False))
+    return pd.to_numeric(nombres, errors='coerce').astype(dtype)
+
+
+def convertir_montant(serie):
+    """Convertit une valeur marchande ('1,30 M €', '500 K €', 275000.0) en euros"""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype('float64')
+    texte = serie.astype('string').str.lower()
+    multiplicateur = np.select(
+        [texte.str.contains(r'\d\s*(?:m|mio)', na=False), texte.str.contains(r'\d\s*(?:k|k€|mille)', na=False)],
+        [1e6, 1e3],
+        default=1.0
+    )
+    return convertir_nombre_fr(texte.str.replace(r'[\s\u202f.](?=\d{3}\b)', '', regex=True), 'float64') * multiplicateur
+
+
+def preparer_donnees(df):
+    """Nettoie les colonnes numériques et ajoute les colonnes calculées"""
+    # Colonnes au format français : virgule décimale et unité ('1,90', '1,85m')
+    for col in ['PPM', 'Taille']:
+        if col in df.columns:
+            df[col] = convertir_nombre_fr(df[col])
+    if 'market_value' in df.columns:
+        df['market_value'] = convertir_montant(df['market_value'])
+    
+    # Nettoyer et convertir les colonnes numériques
+    numeric_cols = ['Age', 'Matchs', 'Buts', 'Passes décisives', 'Minutes jouées', 
+                    'Cartons Jaunes', 'CartonS rouges']
+    
+    for col in numeric_cols:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    
+    # Remplacer les NaN par 0 pour certaines colonnes
+    df['Buts'] = df['Buts'].fillna(0)
+    df['Passes décisives'] = df['Passes décisives'].fillna(0)
+    df['Cartons Jaunes'] = df['Cartons Jaunes'].fillna(0)
+    df['CartonS rouges'] = df['CartonS rouges'].fillna(0)
+    df['market_value'] = df['market_value'].fillna(0)
+    
+    # Ajouter des colonnes calculées
+    df['Ratio_Buts_Matchs'] = df['Buts'] / df['Matchs'].replace(0, np.nan)
+    df['Minutes_par_match'] = df['Minutes jouées'] / df['Matchs'].replace(0, np.nan)
+    df['Contributions_offensives'] = df['Buts'] + df['Passes décisives']
+    df['Cartons_total'] = df['Cartons Jaunes'] + df['CartonS rouges']
+    
+    return df
+
+
+
+def convertir_date_fr(serie):
+    """Convertit des dates en français ('27 janv. 2025') en datetime, de manière vectorisée"""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    parties = serie.astype('string').str.lower().str.extract(r'(\d{1,2})\s+([^\s\d.]+)\.?\s+(\d{4})')
+    return pd.to_datetime(pd.DataFrame({
+        'year': pd.to_numeric(parties[2], errors='coerce'),
+        'month': parties[1].map(MOIS_FR),
+        'day': pd.to_numeric(parties[0], errors='coerce')
+    }), errors='coerce')
+
+
+def decalage_confirme(df, decalage):
+    """Le contenu des colonnes correspond-il au décalage {colonne du fichier: colonne réelle} ?
+
+    Chaque colonne déplacée vers 'Pied' ou 'Date_signature' doit contenir en majorité un pied
+    ou une date en français : un export dont les colonnes ont été corrigées en amont
+    n'est pas modifié.
+    """
+    for source, cible in decalage.items():
+        if source not in df.columns:
+            return False
+        valeurs = df[source].dropna().astype(str).str.strip()
+        if cible == 'Pied':
+            reconnues = valeurs.str.lower().isin(VALEURS_PIED)
+        elif cible == 'Date_signature':
+            reconnues = convertir_date_fr(valeurs).notna()
+        else:
+            continue
+        if len(valeurs) == 0 or reconnues.mean() < 0.5:
+            return False
+    return True
+
+
+def normaliser_schema(df, saison):
+    """Ramène un fichier de saison au schéma canonique en réparant les décalages connus
+
+    Renvoie (df, colonnes_inconnues, corrections), corrections listant les décalages réparés.
+    """
+    df = df.rename(columns=ALIAS_COLONNES)
+    corrections = []
+    decalage = SCHEMAS_SAISONS.get(saison, {})
+    if decalage and decalage_confirme(df, decalage):
+        df = df.rename(columns=decalage)
+        corrections = [f"{source} -> {cible}" for source, cible in decalage.items()]
+    # La saison est déduite du nom de fichier quand la colonne est absente ou incomplète
+    df['Saison'] = df['Saison'].fillna(saison) if 'Saison' in df.columns else saison
+    inconnues = [col for col in df.columns if col not in COLONNES_CANONIQUES]
+    df = df.reindex(columns=COLONNES_CANONIQUES)
+    
+    # Marqueurs de valeur manquante ('-', cellules vides) dans les colonnes texte
+    for col in ['Name', 'Position', 'Pied']:
+        texte = df[col].astype('string').str.strip()
+        manquant = texte.isna() | texte.isin(['-', ''])
+        df[col] = texte.astype(object).where(~manquant, np.nan)
+    df['Date_signature'] = convertir_date_fr(df['Date_signature'])
+    # Un âge à 0 est un marqueur de valeur manquante dans les exports
+    df['Age'] = pd.to_numeric(df['Age'], errors='coerce').mask(lambda age: age <= 0)
+    return df, inconnues, corrections
+
+
+def valider_lignes(df, file):
+    """Écarte les lignes invalides et renvoie (df_valide, quarantaine)"""
+    motifs = {
+        'Nom manquant': df['Name'].isna(),
+        'Saison manquante': df['Saison'].isna(),
+        'Position manquante': df['Position'].isna(),
+        'Valeur négative': (df[COLONNES_COMPTAGE] < 0).any(axis=1),
+        'Âge incohérent': ~df['Age'].between(14, 50) & df['Age'].notna(),
+        'Minutes incohérentes': df['Minutes jouées'] > df['Matchs'].fillna(0) * 130,
+        'Doublon joueur/saison': df.duplicated(['Name', 'Saison']) & df['Name'].notna(),
+    }
+    rejet = pd.Series(False, index=df.index)
+    motif = pd.Series('', index=df.index, dtype=object)
+    for nom, masque in motifs.items():
+        rejet |= masque
+        motif = motif.mask(masque, motif + nom + ', ')
+    quarantaine = pd.DataFrame({
+        'Fichier': file,
+        # Numéro de ligne dans le CSV (en-tête = ligne 1)
+        'Ligne': df.index[rejet] + 2,
+        'Name': df.loc[rejet, 'Name'],
+        'Motif': motif[rejet].str.rstrip(', ')
+    }, columns=COLONNES_QUARANTAINE)
+    return df[~rejet].reset_index(drop=True), quarantaine
+
+
+def lire_saison(base_path, file):
+    """Lit un fichier de saison, le ramène au schéma canonique et met de côté les lignes invalides
+
+    Renvoie (df, quarantaine).
+    """
+    df = pd.read_csv(os.path.join(base_path, file), encoding='utf-8')
+    df, inconnues, corrections = normaliser_schema(df, saison_du_fichier(file))
+    df, quarantaine = valider_lignes(preparer_donnees(df), file)
+    # Anomalies au niveau du fichier (sans numéro de ligne) : colonnes ignorées et décalages réparés
+    motifs = ([f"Colonne inconnue ignorée: {col}" for col in inconnues]
+              + [f"Décalage de colonnes réparé: {correction}" for correction in corrections])
+    if motifs:
+        colonnes = pd.DataFrame({'Fichier': file, 'Ligne': None, 'Name': None, 'Motif': motifs})
+        quarantaine = pd.concat([colonnes, quarantaine], ignore_index=True)
+    return df, quarantaine
+
+
+def compacter_donnees(df):
+    """Convertit le jeu de données fusionné vers un schéma compact et renvoie (df, (octets_avant, octets_apres))"""
+    avant = int(df.memory_usage(deep=True).sum())
+    for col in COLONNES_CATEGORIES:
+        if col in df.columns:
+            categories = sorted(df[col].dropna().astype(str).unique())
+            df[col] = pd.Categorical(df[col].astype(object), categories=categories, ordered=(col == 'Saison'))
+    for col in COLONNES_ENTIERES:
+        if col not in df.columns:
+            continue
+        valeurs = pd.to_numeric(df[col], errors='coerce')
+        # Les colonnes avec des manquants ou des décimales restent en float32 ;
+        # int16 minimum pour que les additions ligne à ligne ne débordent pas
+        if valeurs.isna().any() or not (valeurs == np.floor(valeurs)).all():
+            df[col] = valeurs.astype('float32')
+        elif valeurs.between(np.iinfo('int16').min, np.iinfo('int16').max).all():
+            df[col] = valeurs.astype('int16')
+        elif valeurs.between(np.iinfo('int32').min, np.iinfo('int32').max).all():
+            df[col] = valeurs.astype('int32')
+        else:
+            df[col] = valeurs.astype('int64')
+    for col in COLONNES_RATIOS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+    apres = int(df.memory_usage(deep=True).sum())
+    return df, (avant, apres)
+
+
+def lire_saisons(base_path, files, workers):
+    """Lit plusieurs fichiers de saison, en parallèle si workers > 1
+
+    Renvoie {fichier: ((df, quarantaine), erreur)} : les erreurs sont capturées dans les threads
+    et signalées par l'appelant.
+    """
+    def lire(file):
+        try:
+            return lire_saison(base_path, file), None
+        except Exception as e:
+            return None, e
+    
+    if workers <= 1 or len(files) <= 1:
+        return {file: lire(file) for file in files}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(files, executor.map(lire, files)))
+
+
+def lire_identites(path):
+    """Table des identifiants joueurs, et description de ses erreurs (None si elle est valide)
+
+    Un fichier absent donne une table vide. Les lignes illisibles d'un fichier corrigé à la
+    main (identifiant vide ou non entier, saison ou nom vide) sont écartées et signalées ;
+    un fichier illisible donne une table vide et une erreur.
+    """
+    vide = pd.DataFrame({'ID_joueur': pd.Series(dtype='int32'), 'Saison': pd.Series(dtype=object),
+                         'Name': pd.Series(dtype=object)})
+    if path is None or not os.path.exists(path):
+        return vide, None
+    try:
+        table = pd.read_csv(path, encoding='utf-8', dtype=str, keep_default_na=False)[COLONNES_IDENTITES]
+    except (OSError, ValueError, KeyError) as e:
+        return vide, f"fichier illisible ({e})"
+    identifiants = pd.to_numeric(table['ID_joueur'].str.strip(), errors='coerce')
+    valides = (identifiants.notna() & (identifiants % 1 == 0) & (identifiants > 0)
+               & (table['Saison'] != '') & (table['Name'] != ''))
+    table = table[valides].assign(ID_joueur=identifiants[valides].astype('int32'))
+    erreur = None
+    if not valides.all():
+        # Numéros de ligne du fichier (l'en-tête est la ligne 1)
+        lignes = [str(ligne + 2) for ligne in np.flatnonzero(~valides.to_numpy())]
+        extrait = ', '.join(lignes[:5]) + (', …' if len(lignes) > 5 else '')
+        erreur = f"{len(lignes)} ligne(s) illisible(s) ignorée(s) (ligne {extrait})"
+    return table.reset_index(drop=True), erreur
+
+
+def ecrire_identites(table, path):
+    """Écrit la table des identifiants de manière atomique ; ignorée si le dossier est en lecture seule"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        table.to_csv(tmp_path, index=False, encoding='utf-8')
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def coherent(etat, annee, age, taille):
+    """Une ligne de la saison `annee` peut-elle prolonger la carrière décrite par etat ?
+
+    L'âge doit avoir progressé comme le calendrier (±1 an) depuis la dernière saison où il
+    était connu, et la taille être stable (±3 cm), quand ces valeurs sont connues des deux côtés.
+    """
+    if annee <= etat['annee']:
+        return False
+    if not np.isnan(age) and not np.isnan(etat['age']) and abs(age - etat['age'] - (annee - etat['annee_age'])) > 1:
+        return False
+    if not np.isnan(taille) and not np.isnan(etat['taille']) and abs(taille - etat['taille']) > 0.03:
+        return False
+    return True
+
+
+def homonymes(mots, autres):
+    """Deux noms proches désignent-ils des joueurs distincts ? C'est le cas si l'un complète l'autre
+    d'un mot ('Mourad El Kaabi' / 'Mourad El Kaabi 6') ou si leurs numéros diffèrent ('... 2' / '... 4')"""
+    court, long = sorted((mots, autres), key=len)
+    if len(court) < len(long) and long[:len(court)] == court:
+        return True
+    return [mot for mot in mots if mot.isdigit()] != [mot for mot in autres if mot.isdigit()]
+
+
+def attribuer_identifiants(df, table=None):
+    """Attribue un identifiant entier stable à chaque joueur, à travers les saisons
+
+    Les lignes déjà présentes dans la table (même Saison et même Name) gardent leur
+    identifiant. Les autres, parcourues par saison, rejoignent un joueur connu de même
+    nom normalisé (accents, casse et espaces ignorés : 'El Kaabi' = 'Elkaabi') dont l'âge et
+    la taille sont cohérents, ou à défaut une variante d'écriture proche (trigrammes) vue
+    dans les saisons précédentes, avec un âge et une taille connus et cohérents et le même
+    groupe de postes ; sinon un nouvel identifiant est créé. Un nom complété d'un mot ou
+    d'un autre numéro ('Mourad El Kaabi 2') n'est pas une variante : c'est un homonyme.
+    Renvoie (identifiants alignés sur df (int32), table mise à jour).
+    """
+    if table is None:
+        table, _ = lire_identites(None)
+    cles_table = dict(zip(zip(table['Saison'].astype(str), table['Name'].astype(str)), table['ID_joueur']))
+    prochain = int(table['ID_joueur'].max()) + 1 if len(table) else 1
+
+    saisons = df['Saison'].astype(str).to_numpy()
+    noms = df['Name'].astype(str).to_numpy()
+    annees = np.array([int(saison[:4]) for saison in saisons])
+    ages = pd.to_numeric(df['Age'], errors='coerce').to_numpy(dtype='float64')
+    tailles = pd.to_numeric(df['Taille'], errors='coerce').to_numpy(dtype='float64') \
+        if 'Taille' in df.columns else np.full(len(df), np.nan)
+    groupes = [GROUPES_POSTES.get(poste, poste) for poste in df['Position'].astype(str)] \
+        if 'Position' in df.columns else [None] * len(df)
+    
+    identifiants = np.zeros(len(df), dtype=np.int32)
+    # État de chaque joueur : dernière saison vue, dernier âge connu (et sa saison), dernière
+    # taille connue, groupe de postes et nom ; une valeur manquante n'efface pas la précédente
+    etats = {}
+    par_cle = {}
+    # Index inversé des variantes : (saison, année de naissance, trigramme) -> joueurs. Un âge
+    # cohérent impose des années de naissance (saison - âge) distantes d'au plus un an : seuls
+    # les joueurs des saisons récentes, nés à un an près et partageant un trigramme, sont évalués
+    par_naissance = {}
+    for i in np.argsort(annees, kind='stable'):
+        mots = normaliser_nom(noms[i]).split()
+        cle = ''.join(mots)
+        tri = trigrammes(cle)
+        naissance = None if np.isnan(ages[i]) else int(np.floor(annees[i] - ages[i]))
+        identifiant = cles_table.get((saisons[i], noms[i]))
+        if identifiant is None:
+            candidats = [j for j in par_cle.get(cle, ()) if coherent(etats[j], annees[i], ages[i], tailles[i])]
+            if not candidats and naissance is not None and not np.isnan(tailles[i]):
+                # Variante d'écriture : joueurs récents au nom proche et à l'âge cohérent.
+                # Une similarité de Jaccard ≥ SEUIL impose au moins SEUIL × len(tri) trigrammes
+                # communs : les joueurs en dessous sont écartés avant tout calcul
+                communs = Counter()
+                for t in tri:
+                    porteurs = set()
+                    for annee in range(annees[i] - ECART_VARIANTE_SAISONS, annees[i]):
+                        for annee_naissance in (naissance - 1, naissance, naissance + 1):
+                            porteurs.update(par_naissance.get((annee, annee_naissance, t), ()))
+                    communs.update(porteurs)
+                minimum = SEUIL_VARIANTE_NOM * len(tri)
+                proches = []
+                for j, nombre in communs.items():
+                    if nombre < minimum:
+                        continue
+                    etat = etats[j]
+                    if not annees[i] - ECART_VARIANTE_SAISONS <= etat['annee'] < annees[i]:
+                        continue
+                    if np.isnan(etat['age']) or np.isnan(etat['taille']) or etat['groupe'] != groupes[i]:
+                        continue
+                    if not coherent(etat, annees[i], ages[i], tailles[i]) or homonymes(mots, etat['mots']):
+                        continue
+                    similarite = len(tri & etat['trigrammes']) / len(tri | etat['trigrammes'])
+                    if similarite >= SEUIL_VARIANTE_NOM:
+                        proches.append((similarite, j))
+                candidats = [max(proches)[1]] if proches else []
+            if candidats:
+                # Le joueur vu le plus récemment l'emporte
+                identifiant = max(candidats, key=lambda j: etats[j]['annee'])
+            else:
+                identifiant = prochain
+                prochain += 1
+        identifiant = int(identifiant)
+        identifiants[i] = identifiant
+        etat = etats.get(identifiant)
+        if etat is None:
+            etats[identifiant] = {'annee': annees[i], 'age': ages[i], 'annee_age': annees[i], 'taille': tailles[i],
+                                  'groupe': groupes[i], 'trigrammes': tri, 'mots': mots}
+        elif etat['annee'] <= annees[i]:
+            etat.update(annee=annees[i], groupe=groupes[i], trigrammes=tri, mots=mots)
+            if not np.isnan(ages[i]):
+                etat.update(age=ages[i], annee_age=annees[i])
+            if not np.isnan(tailles[i]):
+                etat['taille'] = tailles[i]
+        par_cle.setdefault(cle, set()).add(identifiant)
+        if naissance is not None:
+            for t in tri:
+                par_naissance.setdefault((annees[i], naissance, t), set()).add(identifiant)
+    
+    nouvelles = pd.DataFrame({'ID_joueur': identifiants, 'Saison': saisons, 'Name': noms})
+    table = (pd.concat([table, nouvelles], ignore_index=True)
+             .drop_duplicates(['Saison', 'Name'], keep='first')
+             .sort_values(['Saison', 'ID_joueur'], kind='stable')
+             .reset_index(drop=True))
+    return identifiants, table
+
+
+def identifier_joueurs(df, path=None):
+    """Ajoute la colonne ID_joueur au DataFrame, en persistant la table des identifiants dans path
+
+    Renvoie (df, erreur). Une table en partie illisible n'est pas réécrite, pour ne pas effacer
+    la correction à la main en cours : ses lignes valides s'appliquent et erreur la décrit.
+    """
+    table, erreur = lire_identites(path)
+    identifiants, table_mise_a_jour = attribuer_identifiants(df, table)
+    df['ID_joueur'] = identifiants
+    if path is not None and erreur is None and not table_mise_a_jour.equals(table):
+        ecrire_identites(table_mise_a_jour, path)
+    return df, erreur
+
+
+def table_joueurs(df):
+    """Joueurs par identifiant : nom canonique (orthographe de la saison la plus récente),
+    première et dernière saison, et variantes de nom rencontrées"""
+    lignes = df[['ID_joueur', 'Saison', 'Name']].sort_values('Saison', kind='stable')
+    groupes = lignes.groupby('ID_joueur', sort=True)
+    # Variantes : paires (joueur, nom) distinctes triées, découpées aux changements de joueur
+    paires = df[['ID_joueur', 'Name']].drop_duplicates()
+    paires = paires.assign(Name=paires['Name'].astype(str)).sort_values(['ID_joueur', 'Name'])
+    identifiants = paires['ID_joueur'].to_numpy()
+    debuts = np.flatnonzero(np.r_[True, identifiants[1:] != identifiants[:-1]])
+    noms = paires['Name'].to_numpy(dtype=object)
+    joueurs = pd.DataFrame({
+        'Name': groupes['Name'].last().astype(str),
+        'Premiere_saison': groupes['Saison'].first().astype(str),
+        'Derniere_saison': groupes['Saison'].last().astype(str),
+    })
+    joueurs['Variantes'] = pd.Series([variantes.tolist() for variantes in np.split(noms, debuts[1:])],
+                                     index=identifiants[debuts], dtype=object)
+    return joueurs
+
+
+def donnees_exemple():
+    """Jeu de données d'exemple, utilisé pour la démonstration quand aucun fichier n'est lisible"""
+    data = {
+        'Name': ['Nadir Lamyaghri', 'Mourad Lemsen', 'Youssef Rabeh', 'Hicham Amrani', 
+                 'Ayoub El Kaabi', 'Yahya Jabrane', 'Walid El Karti'] * 15,
+        'Position': ['Gardien de but', 'Défense', 'Défenseur central', 'Défenseur central',
+                    'Avant-centre', 'Milieu central', 'Ailier droit'] * 15,
+        'Age': [34, 31, 26, 25, 28, 27, 24] * 15,
+        'Matchs': [21, 25, 23, 24, 30, 28, 20] * 15,
+        'Buts': [0, 1, 0, 1, 15, 5, 8] * 15,
+        'Passes décisives': [0, 2, 0, 1, 3, 8, 6] * 15,
+        'Minutes jouées': [1890, 2245, 2070, 2147, 2700, 2520, 1800] * 15,
+        'Cartons Jaunes': [0, 6, 2, 8, 3, 4, 2] * 15,
+        'CartonS rouges': [0, 0, 0, 0, 0, 1, 0] * 15,
+        'market_value': [275000, 150000, 200000, 180000, 800000, 600000, 450000] * 15,
+        'Saison': ['2011/12', '2012/13', '2013/14', '2014/15', '2015/16', 
+                  '2016/17', '2017/18', '2018/19', '2019/20', '2020/21',
+                  '2021/22', '2022/23', '2023/24', '2024/25', '2011/12'] * 7,
+        'PPM': [1.90, 1.68, 1.65, 1.58, 2.10, 1.95, 1.75] * 15
+    }
+    df = preparer_donnees(pd.DataFrame(data))
+    # Âges figés d'une saison à l'autre : un identifiant par nom
+    df['ID_joueur'] = (pd.factorize(df['Name'], sort=True)[0] + 1).astype('int32')
+    return compacter_donnees(df)
+
+
+def charger_donnees(signature, base_path=DATA_DIR, snapshot_path=SNAPSHOT_PATH, workers=LOAD_WORKERS):
+    """Charge et prépare les données du Wydad
+
+    Seuls les fichiers nouveaux ou modifiés depuis le dernier snapshot sont relus ;
+    les saisons inchangées sont reprises telles quelles du snapshot. Si la table des
+    identifiants a changé depuis (correction à la main), elle est réappliquée à toutes les lignes.
+    Renvoie (df, rapport) : rapport['quarantaine'] liste les lignes écartées à l'ingestion,
+    rapport['memoire'] l'empreinte mémoire (octets) avant et après compactage,
+    rapport['version'] identifie la version du jeu de données (sources et table des
+    identifiants, dont rapport['identites'] est la signature) et rapport['alertes'] liste
+    les fichiers non chargés ou la table des identifiants illisible (niveau 'warning' ou
+    'error', message). Sans aucun fichier
+    lisible, le jeu d'exemple est renvoyé avec la version 'exemple' et rapport['erreur'].
+    """
+    alertes = []
+    try:
+        if not signature:
+            raise FileNotFoundError("Aucun fichier trouvé")
+        
+        snapshot = lire_snapshot(snapshot_path)
+        df_snapshot, segments, rapport_snapshot = snapshot if snapshot is not None else (None, {}, None)
+        # Snapshot à jour (sources et table des identifiants) : pas de relecture des CSV
+        if (df_snapshot is not None and list(segments) == list(signature)
+                and rapport_snapshot['identites'] == signature_identites(base_path)):
+            version = version_donnees(signature, rapport_snapshot['identites'])
+            return df_snapshot, {**rapport_snapshot, 'version': version, 'alertes': alertes}
+        quarantaine_snapshot = rapport_snapshot['quarantaine'] if rapport_snapshot else None
+        
+        # Lire en parallèle les fichiers nouveaux ou modifiés (l'ordre des saisons est conservé)
+        a_lire = [source[0] for source in signature if source not in segments]
+        lectures = lire_saisons(base_path, a_lire, workers)
+        
+        # Assembler les saisons, en reprenant les fichiers inchangés du snapshot
+        dfs = []
+        quarantaines = []
+        sources = []
+        for source in signature:
+            file = source[0]
+            if source in segments:
+                debut, nb_lignes = segments[source]
+                dfs.append(df_snapshot.iloc[debut:debut + nb_lignes])
+                quarantaines.append(quarantaine_snapshot[quarantaine_snapshot['Fichier'] == file])
+                sources.append(source)
+                continue
+            resultat, erreur = lectures[file]
+            if erreur is None:
+                df_temp, quarantaine_temp = resultat
+                dfs.append(df_temp)
+                quarantaines.append(quarantaine_temp)
+                sources.append(source)
+            elif isinstance(erreur, FileNotFoundError):
+                alertes.append(('warning', f"⚠️ Fichier non trouvé: {file}"))
+            else:
+                alertes.append(('error', f"❌ Erreur avec {file}: {str(erreur)}"))
+        
+        if not dfs:
+            raise FileNotFoundError("Aucun fichier trouvé")
+        # Identifiants joueurs stables, persistés à côté des fichiers de saison ; la table
+        # s'applique aussi aux lignes reprises du snapshot. Une table illisible est signalée
+        # comme une erreur : le snapshot n'est pas écrit et l'alerte revient jusqu'à correction
+        df, erreur_identites = identifier_joueurs(pd.concat(dfs, ignore_index=True),
+                                                  os.path.join(base_path, IDENTITES_FICHIER))
+        if erreur_identites is not None:
+            alertes.append(('error', f"❌ Table des identifiants {IDENTITES_FICHIER} non mise à jour: "
+                                     f"{erreur_identites}"))
+        df, memoire = compacter_donnees(df)
+        identites = signature_identites(base_path)
+        rapport = {'quarantaine': pd.concat(quarantaines, ignore_index=True), 'memoire': memoire,
+                   'identites': identites, 'version': version_donnees(signature, identites),
+                   'alertes': alertes}
+        # Un fichier illisible ne doit pas être figé dans le snapshot
+        if not any(niveau == 'error' for niveau, _ in alertes):
+            ecrire_snapshot(df, snapshot_path, sources, [len(d) for d in dfs], rapport)
+        return df, rapport
+    
+    except Exception as e:
+        df, memoire = donnees_exemple()
+        return df, {'quarantaine': pd.DataFrame(columns=COLONNES_QUARANTAINE), 'memoire': memoire,
+                    'version': 'exemple', 'alertes': alertes, 'erreur': str(e)}
+
+
+def charger(base_path=DATA_DIR):
+    """Découvre les fichiers de saison de base_path et renvoie (df, rapport)"""
+    return charger_donnees(signature_sources(base_path), base_path, chemin_snapshot(base_path))
+
+
+def construire_index(df):
+    """Index des positions de lignes par Saison, Position, ID_joueur et (Saison, Position)
+
+    Chaque filtre ou recherche de joueur devient une lecture de dictionnaire suivie
+    d'une sélection directe des lignes.
+    """
+    return {
+        cles: df.groupby(list(cles) if isinstance(cles, tuple) else cles, observed=True, sort=False).indices
+        for cles in ['Saison', 'Position', 'ID_joueur', ('Saison', 'Position')]
+    }
+
+
+def selectionner(df, positions):
+    """Sélectionne des lignes par position ; une plage contiguë est renvoyée comme tranche (vue)"""
+    if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+        return df.iloc[positions[0]:positions[-1] + 1]
+    return df.take(positions)
+
+
+def lignes_filtre(index, saison, position):
+    """Positions des lignes correspondant au filtre, ou None sans filtre"""
+    vide = np.array([], dtype=np.intp)
+    if saison == 'Toutes' and position == 'Toutes':
+        return None
+    if position == 'Toutes':
+        return index['Saison'].get(saison, vide)
+    if saison == 'Toutes':
+        return index['Position'].get(position, vide)
+    return index[('Saison', 'Position')].get((saison, position), vide)
+
+
+def filtrer_donnees(df, index, saison, position):
+    """Lignes correspondant au filtre (saison, position), sans copie complète du DataFrame
+
+    Sans filtre, le DataFrame est renvoyé tel quel. Le résultat ne doit pas être modifié.
+    """
+    positions = lignes_filtre(index, saison, position)
+    return df if positions is None else selectionner(df, positions)
+
+# Colonnes sommées dans le cube d'agrégats
+COLONNES_CUBE = ['Matchs', 'Buts', 'Passes décisives', 'Minutes jouées',
+                 'Cartons Jaunes', 'CartonS rouges', 'market_value']
+
+
+def construire_cube(df, joueurs=None):
+    """Cube pré-agrégé ID_joueur × Saison × Position : sommes des comptages et nombre de lignes
+
+    Les cellules sont dans l'ordre de première apparition des lignes, ce qui préserve
+    la sémantique de 'first' lors des agrégations par joueur. Tous les graphiques à base
+    de groupby sont dérivés de ce cube par simple ré-agrégation sur la clé entière
+    ID_joueur ; la colonne Name porte le nom canonique du joueur (table_joueurs).
+    """
+    if joueurs is None:
+        joueurs = table_joueurs(df)
+    groupes = df.groupby(['ID_joueur', 'Saison', 'Position'], observed=True, sort=False)
+    cube = groupes[COLONNES_CUBE].sum()
+    cube['Lignes'] = groupes.size()
+    cube = cube.reset_index()
+    cube.insert(1, 'Name', pd.Categorical(joueurs['Name'].reindex(cube['ID_joueur']).to_numpy()))
+    return cube
+
+
+def filtrer_cube(cube, saison, position):
+    """Cellules du cube correspondant au filtre de la barre latérale"""
+    if saison == 'Toutes' and position == 'Toutes':
+        return cube
+    masque = np.ones(len(cube), dtype=bool)
+    if saison != 'Toutes':
+        masque &= (cube['Saison'] == saison).to_numpy()
+    if position != 'Toutes':
+        masque &= (cube['Position'] == position).to_numpy()
+    return cube[masque]
+
+
+def agreger_cube(cube, par, colonnes):
+    """Ré-agrège le cube (sommes) selon une ou plusieurs dimensions"""
+    return cube.groupby(par, observed=True)[colonnes].sum()
+
+# Métriques classées dans les records (libellé affiché par colonne)
+METRIQUES_RECORDS = {
+    'Buts': 'Buts',
+    'Passes décisives': 'Passes décisives',
+    'Minutes jouées': 'Minutes jouées',
+    'Matchs': 'Matchs',
+    'Cartons Jaunes': 'Cartons jaunes',
+    'market_value': 'Valeur marchande',
+}
+# Taille des classements (les ex æquo au-delà de cette limite sont conservés)
+RECORDS_TOP_K = 10
+
+
+def calculer_records(df, cube, k=RECORDS_TOP_K):
+    """Classements top-k par métrique, sur une saison et sur la carrière, en une seule agrégation
+
+    Renvoie {'saison': {metrique: DataFrame}, 'carriere': {metrique: DataFrame}, 'equipe': {...}}.
+    Les classements carrière sont ré-agrégés depuis les totaux par saison.
+    """
+    metriques = list(METRIQUES_RECORDS)
+    par_saison = agreger_cube(cube, ['ID_joueur', 'Saison'], metriques).reset_index()
+    noms = cube.drop_duplicates('ID_joueur').set_index('ID_joueur')['Name']
+    par_saison.insert(1, 'Name', noms.reindex(par_saison['ID_joueur']).to_numpy())
+    carriere = par_saison.groupby('ID_joueur')[metriques].sum().reset_index()
+    carriere.insert(1, 'Name', noms.reindex(carriere['ID_joueur']).to_numpy())
+    return {
+        'saison': {m: par_saison.nlargest(k, m, keep='all')[['Name', 'Saison', m]] for m in metriques},
+        'carriere': {m: carriere.nlargest(k, m, keep='all')[['Name', m]] for m in metriques},
+        'equipe': {
+            'joueurs': df['ID_joueur'].nunique(),
+            'buts': int(df['Buts'].sum()),
+            'passes': int(df['Passes décisives'].sum()),
+            'minutes': int(df['Minutes jouées'].sum()),
+            'age_moyen': float(df['Age'].mean()),
+        }
+    }
+
+
+def detenteurs(classement, metrique, avec_saison=False):
+    """Valeur du record et liste de ses détenteurs (ex æquo compris)"""
+    if classement.empty:
+        return 0, "-"
+    valeur = classement[metrique].iloc[0]
+    tete = classement[classement[metrique] == valeur]
+    if avec_saison:
+        noms = [f"{nom} ({saison})" for nom, saison in zip(tete['Name'], tete['Saison'])]
+    else:
+        noms = tete['Name'].astype(str).tolist()
+    return valeur, " / ".join(noms)
+
+def calculer_retention(df):
+    """Rétention de l'effectif pour toutes les paires de saisons, en une passe vectorisée
+
+    Construit une matrice de présence joueur × saison ; le produit matriciel P.T @ P donne
+    le nombre de joueurs communs à chaque paire de saisons (N → N+k pour tout k).
+    Renvoie {'saisons': [...], 'matrice': DataFrame des taux N → N+k (%),
+    'transitions': DataFrame N → N+1 (effectif, conservés, arrivées, départs, retours)}.
+    """
+    codes_joueurs, joueurs = pd.factorize(df['ID_joueur'])
+    codes_saisons, saisons = pd.factorize(df['Saison'], sort=True)
+    presence = np.zeros((len(joueurs), len(saisons)), dtype=bool)
+    presence[codes_joueurs, codes_saisons] = True
+    
+    matrice_presence = presence.astype(np.int32)
+    communs = matrice_presence.T @ matrice_presence
+    effectif = np.diag(communs)
+    # Joueurs déjà passés par le club à une saison antérieure ou égale
+    deja_vus = np.logical_or.accumulate(presence, axis=1)
+    
+    conserves = np.diag(communs, k=1)
+    arrivees = effectif[1:] - conserves
+    retours = (presence[:, 1:] & ~presence[:, :-1] & deja_vus[:, :-1]).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        taux = np.where(effectif[:-1] > 0, conserves / effectif[:-1] * 100, 0.0)
+        # Seules les paires N → N+k (k ≥ 1) ont un sens : triangle supérieur strict
+        apres = np.triu(np.ones_like(communs, dtype=bool), k=1)
+        matrice = np.where(apres, communs / effectif[:, None] * 100, np.nan)
+    
+    saisons = [str(saison) for saison in saisons]
+    transitions = pd.DataFrame({
+        'Saison': [f"{s1} → {s2}" for s1, s2 in zip(saisons[:-1], saisons[1:])],
+        'Taux de Rétention (%)': taux,
+        'Joueurs Conservés': conserves,
+        'Effectif Saison N': effectif[:-1],
+        'Arrivées': arrivees,
+        'Départs': effectif[:-1] - conserves,
+        'Retours': retours
+    })
+    matrice = pd.DataFrame(matrice, index=saisons, columns=saisons)
+    return {'saisons': saisons, 'matrice': matrice, 'transitions': transitions}
+
+# Variables de la matrice de corrélation
+COLONNES_CORRELATION = ['Age', 'Matchs', 'Buts', 'Passes décisives', 'Minutes jouées',
+                        'Cartons Jaunes', 'PPM', 'market_value']
+
+
+def statistiques_suffisantes(valeurs):
+    """Statistiques suffisantes de Pearson par paire de variables (observations complètes par paire)
+
+    Pour une matrice n × k (NaN = manquant), renvoie un tableau 4 × k × k : nombre
+    d'observations, sommes de x, sommes de x² (sur les lignes où la variable de colonne
+    est renseignée) et sommes des produits croisés. Les statistiques s'additionnent entre
+    sous-ensembles de lignes.
+    """
+    presentes = ~np.isnan(valeurs)
+    x = np.where(presentes, valeurs, 0.0)
+    m = presentes.astype(np.float64)
+    return np.stack([m.T @ m, x.T @ m, (x * x).T @ m, x.T @ x])
+
+
+def construire_stats_correlation(df, index):
+    """Statistiques de corrélation par cellule Saison × Position, en une passe
+
+    Les variables sont centrées sur leur moyenne globale avant accumulation (stabilité
+    numérique, sans effet sur les corrélations). Renvoie {'colonnes', 'cellules': [(saison,
+    position)], 'stats': tableau cellules × 4 × k × k}.
+    """
+    colonnes = [colonne for colonne in COLONNES_CORRELATION if colonne in df.columns]
+    valeurs = df[colonnes].to_numpy(dtype=np.float64, na_value=np.nan)
+    valeurs = valeurs - np.nanmean(valeurs, axis=0)
+    cellules = list(index[('Saison', 'Position')])
+    stats = np.stack([statistiques_suffisantes(valeurs[index[('Saison', 'Position')][cellule]])
+                      for cellule in cellules])
+    return {'colonnes': colonnes, 'cellules': cellules, 'stats': stats}
+
+
+def correlation_pearson(stats, saison, position):
+    """Matrice de Pearson d'un filtre, assemblée en sommant les statistiques de ses cellules"""
+    masque = np.array([(saison == 'Toutes' or s == saison) and (position == 'Toutes' or p == position)
+                       for s, p in stats['cellules']], dtype=bool)
+    n, sx, sxx, sxy = stats['stats'][masque].sum(axis=0)
+    # sx[i, j] : somme de i sur les lignes où j est renseignée (la somme de j est sx.T)
+    variance = n * sxx - sx * sx
+    # Variance nulle aux erreurs d'arrondi près (variable constante sur la sélection)
+    variance = np.where(variance > 1e-12 * n * sxx, variance, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = (n * sxy - sx * sx.T) / np.sqrt(variance * variance.T)
+    corr = np.clip(np.where(variance * variance.T > 0, corr, np.nan), -1.0, 1.0)
+    np.fill_diagonal(corr, np.where(np.diag(variance) > 0, 1.0, np.nan))
+    return pd.DataFrame(corr, index=stats['colonnes'], columns=stats['colonnes'])
+
+
+def correlation_spearman(df):
+    """Matrice de Spearman (les rangs dépendent de la sélection : pas d'assemblage par cellule)"""
+    colonnes = [colonne for colonne in COLONNES_CORRELATION if colonne in df.columns]
+    return df[colonnes].corr(method='spearman')
+
+# Budget de points envoyés au navigateur par graphique (WYDAD_POINTS_MAX)
+POINTS_MAX_GRAPHIQUE = int(os.environ.get('WYDAD_POINTS_MAX', 2000))
+
+
+def reduire_nuage(points, x, y, groupe, taille, budget=POINTS_MAX_GRAPHIQUE):
+    """Nuage de points borné à `budget` marqueurs, agrégés sur une grille au-delà
+
+    Sous le budget, les points sont renvoyés tels quels. Au-delà, chaque groupe est
+    découpé en une grille x × y ; un marqueur par case non vide, placé au barycentre,
+    de taille la somme de `taille`, et libellé par le nombre de joueurs (colonne Name).
+    Renvoie (points, agrege).
+    """
+    if len(points) <= budget:
+        return points, False
+    points = points.dropna(subset=[x, y])
+    nb_groupes = max(points[groupe].nunique(), 1)
+    nb_cases = max(int(np.sqrt(budget / nb_groupes)), 1)
+
+    cases = {}
+    for colonne in (x, y):
+        valeurs = points[colonne].to_numpy(dtype='float64')
+        etendue = valeurs.max() - valeurs.min()
+        relatif = (valeurs - valeurs.min()) / etendue if etendue > 0 else np.zeros_like(valeurs)
+        cases[colonne] = np.minimum((relatif * nb_cases).astype(np.int64), nb_cases - 1)
+
+    agrege = points.groupby([points[groupe], cases[x], cases[y]], observed=True, sort=False).agg(
+        **{x: (x, 'mean'), y: (y, 'mean'), taille: (taille, 'sum'), 'Name': (x, 'size')}
+    ).reset_index(level=0).reset_index(drop=True)
+    agrege['Name'] = agrege['Name'].astype(str) + " joueurs"
+    return agrege, True
+
+
+def limiter_lignes(matrice, n=20, libelle="Autres (moyenne)"):
+    """Heatmap bornée à n lignes : les n lignes au plus fort total, puis une ligne moyenne des autres"""
+    if len(matrice) <= n:
+        return matrice
+    totaux = matrice.sum(axis=1)
+    ordre = totaux.sort_values(ascending=False).index
+    tete = matrice.loc[ordre[:n]]
+    autres = matrice.loc[ordre[n:]].mean().to_frame(libelle).T
+    return pd.concat([tete, autres])
+
+
+def repartition_positions(df):
+    """Nombre de lignes joueur/saison par position"""
+    pos_counts = df['Position'].value_counts()
+    pos_counts = pos_counts[pos_counts > 0].reset_index()
+    pos_counts.columns = ['Position', 'count']
+    return pos_counts
+
+
+def evolution_saisons(cube):
+    """Buts, passes décisives et minutes jouées par saison"""
+    return agreger_cube(cube, 'Saison', ['Buts', 'Passes décisives', 'Minutes jouées']).reset_index()
+
+
+def top_buteurs(cube, n=10):
+    """Meilleurs buteurs (buts et matchs cumulés, première position occupée)"""
+    return cube.groupby('ID_joueur').agg(
+        Name=('Name', 'first'),
+        Buts=('Buts', 'sum'),
+        Matchs=('Matchs', 'sum'),
+        Position=('Position', 'first')
+    ).sort_values('Buts', ascending=False).head(n).reset_index(drop=True)
+
+
+def top_contributions(df, n=5):
+    """Meilleures contributions offensives (buts + passes) sur une saison"""
+    return df.nlargest(n, 'Contributions_offensives')[
+        ['Name', 'Buts', 'Passes décisives', 'Contributions_offensives']
+    ]
+
+
+def cartons_par_position(cube):
+    """Cartons jaunes et rouges par position"""
+    return agreger_cube(cube, 'Position', ['Cartons Jaunes', 'CartonS rouges']).reset_index()
+
+
+def top_sanctionnes(df, n=10, avec_saison=False):
+    """Joueurs les plus sanctionnés sur une saison"""
+    colonnes = ['Name', 'Cartons Jaunes', 'CartonS rouges', 'Cartons_total']
+    if avec_saison:
+        colonnes.append('Saison')
+    return df.nlargest(n, 'Cartons_total')[colonnes]
+
+
+def minutes_par_position(cube):
+    """Minutes jouées par position"""
+    return agreger_cube(cube, 'Position', ['Minutes jouées']).reset_index()
+
+
+def top_temps_de_jeu(df, n=10, avec_saison=False):
+    """Plus gros temps de jeu sur une saison"""
+    colonnes = ['Name', 'Position', 'Matchs', 'Minutes jouées', 'Minutes_par_match']
+    if avec_saison:
+        colonnes.append('Saison')
+    return df.nlargest(n, 'Minutes jouées')[colonnes]
+
+
+def top_valeur(df, n=10):
+    """Joueurs les plus chers (valeur marchande sur une saison)"""
+    return df.nlargest(n, 'market_value')[['Name', 'market_value', 'Position']]
+
+
+def valeur_par_position(cube):
+    """Valeur marchande par position : totale ('sum'), nombre de lignes ('count') et moyenne ('mean')"""
+    valeur_pos = agreger_cube(cube, 'Position', ['market_value', 'Lignes']).reset_index()
+    valeur_pos = valeur_pos.rename(columns={'market_value': 'sum', 'Lignes': 'count'})
+    valeur_pos['mean'] = valeur_pos['sum'] / valeur_pos['count']
+    return valeur_pos
+
+
+def valeur_par_saison(cube):
+    """Valeur marchande par saison : totale ('sum') et moyenne par ligne ('mean')"""
+    valeur_saison = agreger_cube(cube, 'Saison', ['market_value', 'Lignes']).reset_index()
+    valeur_saison = valeur_saison.rename(columns={'market_value': 'sum'})
+    valeur_saison['mean'] = valeur_saison['sum'] / valeur_saison['Lignes']
+    return valeur_saison
+
+
+def calculer_efficacite(cube):
+    """Ratios d'efficacité par joueur : buts par match, minutes par but, contributions par match"""
+    efficacite = cube.groupby('ID_joueur').agg(**{
+        'Name': ('Name', 'first'),
+        'Buts': ('Buts', 'sum'),
+        'Matchs': ('Matchs', 'sum'),
+        'Minutes jouées': ('Minutes jouées', 'sum'),
+        'Passes décisives': ('Passes décisives', 'sum'),
+        'Position': ('Position', 'first')
+    }).reset_index(drop=True)
+    
+    efficacite['Buts_par_match'] = efficacite['Buts'] / efficacite['Matchs']
+    efficacite['Minutes_par_but'] = efficacite['Minutes jouées'] / efficacite['Buts'].replace(0, np.nan)
+    efficacite['Contributions_par_match'] = (efficacite['Buts'] + efficacite['Passes décisives']) / efficacite['Matchs']
+    return efficacite
+
+
+def nombre_saisons(cube):
+    """Nombre de saisons disputées par joueur, par ordre décroissant"""
+    nb_saisons = cube.groupby('ID_joueur').agg(
+        Joueur=('Name', 'first'),
+        Saisons=('Saison', 'nunique')
+    ).sort_values('Saisons', ascending=False, kind='stable').reset_index(drop=True)
+    nb_saisons.columns = ['Joueur', 'Nombre de Saisons']
+    return nb_saisons
+
+
+def presences_saisons(cube, n=20):
+    """Matchs joués par joueur et par saison : les n joueurs les plus utilisés, puis la moyenne des autres"""
+    presences = cube.pivot_table(
+        index='ID_joueur', 
+        columns='Saison', 
+        values='Matchs', 
+        aggfunc='sum',
+        observed=True
+    ).fillna(0)
+    presences = limiter_lignes(presences, n)
+    # Libellés : nom canonique des joueurs affichés (la ligne des autres garde son libellé)
+    noms = cube.drop_duplicates('ID_joueur').set_index('ID_joueur')['Name'].astype(str)
+    presences.index = [noms.get(cle, cle) for cle in presences.index]
+    presences.index.name = 'Name'
+    return presences
+
+
+# Statistiques cumulées dans les résumés de carrière, dans l'ordre d'affichage
+COLONNES_CARRIERE = ['Matchs', 'Buts', 'Passes décisives', 'Minutes jouées', 'Cartons Jaunes']
+
+
+def calculer_carrieres(df, joueurs):
+    """Résumés de carrière de tous les joueurs, calculés en une passe
+
+    Renvoie {'resume': DataFrame indexé par ID_joueur (nom, nombre de saisons, période,
+    position la plus fréquente, totaux, meilleure saison par statistique, PPM disponible),
+    'saisons': statistiques et PPM moyen par joueur et par saison, triées par joueur puis
+    saison, 'bornes': {ID_joueur: (début, fin)} plage des lignes du joueur dans 'saisons'}.
+    """
+    groupes = df.groupby(['ID_joueur', 'Saison'], observed=True, sort=True)
+    saisons = groupes[COLONNES_CARRIERE].sum()
+    saisons['PPM'] = groupes['PPM'].mean()
+    saisons = saisons.reset_index()
+    saisons['Saison'] = saisons['Saison'].astype(str)
+
+    par_joueur = saisons.groupby('ID_joueur', sort=True)
+    resume = par_joueur[COLONNES_CARRIERE].sum()
+    resume.insert(0, 'Name', joueurs['Name'].reindex(resume.index))
+    resume.insert(1, 'Nb_saisons', par_joueur.size())
+    premiere, derniere = par_joueur['Saison'].first(), par_joueur['Saison'].last()
+    resume.insert(2, 'Periode', premiere.where(premiere == derniere, premiere + " - " + derniere))
+    # Position la plus fréquente (à égalité, la première par ordre alphabétique, comme mode())
+    positions = df.groupby(['ID_joueur', 'Position'], observed=True).size().rename('n').reset_index()
+    positions = positions.sort_values(['ID_joueur', 'n', 'Position'], ascending=[True, False, True])
+    resume.insert(3, 'Position', positions.drop_duplicates('ID_joueur').set_index('ID_joueur')['Position']
+                  .astype(str).reindex(resume.index))
+    for colonne in COLONNES_CARRIERE:
+        meilleures = saisons.loc[par_joueur[colonne].idxmax(), ['ID_joueur', 'Saison']]
+        resume[f"Meilleure_saison_{colonne}"] = meilleures.set_index('ID_joueur')['Saison']
+    resume['PPM_disponible'] = par_joueur['PPM'].count() > 0
+
+    debuts = par_joueur.size().cumsum() - par_joueur.size()
+    bornes = {identifiant: (debut, debut + n)
+              for identifiant, debut, n in zip(resume.index, debuts, resume['Nb_saisons'])}
+    return {'resume': resume, 'saisons': saisons, 'bornes': bornes}
+
+
+def carriere_joueur(carrieres, identifiant):
+    """Résumé de carrière d'un joueur, lu sans agrégation
+
+    Renvoie (resume (Series), stats_saison, ppm_saison) : statistiques par saison et
+    moyenne de PPM par saison (None sans données PPM).
+    """
+    resume = carrieres['resume'].loc[identifiant]
+    debut, fin = carrieres['bornes'][identifiant]
+    saisons = carrieres['saisons'].iloc[debut:fin]
+    stats_saison = saisons[['Saison'] + COLONNES_CARRIERE]
+    ppm_saison = saisons[['Saison', 'PPM']] if resume['PPM_disponible'] else None
+    return resume, stats_saison, ppm_saison
+
+# Axes du radar de comparaison (colonne -> libellé), calculés par 90 minutes sauf PPM et minutes/match
+METRIQUES_COMPARAISON = {
+    'Buts_90': 'Buts /90',
+    'Passes_90': 'Passes /90',
+    'Contributions_90': 'Buts + passes /90',
+    'Cartons_90': 'Cartons /90',
+    'Minutes_par_match': 'Minutes /match',
+    'PPM': 'PPM',
+}
+# Minutes minimales pour figurer dans une cohorte (les per-90 sur quelques minutes sont du bruit)
+MINUTES_MIN_COHORTE = 270
+# Taille minimale d'une cohorte de centiles ; en dessous, on élargit (voir cohorte_joueur)
+TAILLE_MIN_COHORTE = 10
+# Nombre maximal de joueurs comparés
+MAX_JOUEURS_COMPARAISON = 10
+
+
+def valeurs_par_90(df):
+    """Métriques de comparaison par ligne joueur/saison (NaN sans minutes jouées)"""
+    # Calculs en float64 : les comptages compacts (int16) déborderaient une fois multipliés
+    par_90 = 90 / df['Minutes jouées'].astype('float64').where(lambda m: m > 0)
+    return pd.DataFrame({
+        'Buts_90': df['Buts'].astype('float64') * par_90,
+        'Passes_90': df['Passes décisives'].astype('float64') * par_90,
+        'Contributions_90': df['Contributions_offensives'].astype('float64') * par_90,
+        'Cartons_90': df['Cartons_total'].astype('float64') * par_90,
+        'Minutes_par_match': df['Minutes_par_match'].astype('float64'),
+        'PPM': df['PPM'].astype('float64'),
+    }, index=df.index)[list(METRIQUES_COMPARAISON)]
+
+
+def construire_cohortes(df, index, minutes_min=MINUTES_MIN_COHORTE):
+    """Distributions triées de chaque métrique par cohorte
+
+    Cohortes : Saison × Position, Position toutes saisons confondues ('Toutes', position),
+    groupe de postes toutes saisons ('Toutes', groupe) et tous les joueurs ('Toutes', 'Toutes').
+    Renvoie {'valeurs': métriques par ligne de df, 'lignes': {(ID_joueur, saison): ligne},
+    'tries': {(saison, poste): {métrique: valeurs triées}}}. Seules les lignes avec au
+    moins `minutes_min` minutes entrent dans les cohortes ; le rang d'un joueur s'obtient
+    ensuite par recherche dichotomique, sans reparcourir le DataFrame.
+    """
+    valeurs = valeurs_par_90(df)
+    matrice = valeurs.to_numpy(dtype='float64')
+    eligibles = (df['Minutes jouées'] >= minutes_min).to_numpy()
+    cellules = dict(index[('Saison', 'Position')])
+    groupes = {}
+    for position, positions in index['Position'].items():
+        cellules[('Toutes', position)] = positions
+        groupes.setdefault(GROUPES_POSTES.get(position, position), []).append(positions)
+    for groupe, listes in groupes.items():
+        cellules.setdefault(('Toutes', groupe), np.concatenate(listes))
+    cellules[('Toutes', 'Toutes')] = np.arange(len(df))
+    tries = {}
+    for cellule, positions in cellules.items():
+        cohorte = matrice[positions[eligibles[positions]]]
+        tries[cellule] = {metrique: np.sort(colonne[~np.isnan(colonne)])
+                          for metrique, colonne in zip(METRIQUES_COMPARAISON, cohorte.T)}
+    lignes = dict(zip(zip(df['ID_joueur'].tolist(), df['Saison'].astype(str).tolist()), range(len(df))))
+    return {'valeurs': valeurs, 'lignes': lignes, 'tries': tries}
+
+
+def percentile(tries, valeur):
+    """Rang centile (0-100) de valeur dans des valeurs triées, ex æquo au rang moyen"""
+    if len(tries) == 0 or np.isnan(valeur):
+        return np.nan
+    dessous = np.searchsorted(tries, valeur, side='left')
+    egaux = np.searchsorted(tries, valeur, side='right') - dessous
+    return (dessous + egaux / 2) / len(tries) * 100
+
+
+def cohorte_joueur(cohortes, saison, position, taille_min=TAILLE_MIN_COHORTE):
+    """Cohorte de référence d'un joueur/saison : la plus fine d'au moins taille_min joueurs
+
+    Même poste et même saison, puis même poste toutes saisons, puis même groupe de postes
+    toutes saisons, enfin tous les joueurs. Renvoie (libellé, valeurs triées par métrique).
+    """
+    groupe = GROUPES_POSTES.get(position, position)
+    candidates = [((saison, position), f"{position} · {saison}"),
+                  (('Toutes', position), f"{position} · toutes saisons"),
+                  (('Toutes', groupe), f"{groupe} · toutes saisons"),
+                  (('Toutes', 'Toutes'), "Tous les joueurs")]
+    for cle, libelle in candidates:
+        tries = cohortes['tries'].get(cle, {})
+        if len(tries.get('Buts_90', ())) >= taille_min:
+            return libelle, tries
+    return libelle, tries
+
+
+def saison_par_defaut(df, cohortes, identifiant, saisons, minutes_min=MINUTES_MIN_COHORTE):
+    """Position dans saisons de la première saison du joueur classable dans une cohorte
+    (au moins minutes_min minutes), 0 s'il n'en a aucune"""
+    for position, saison in enumerate(saisons):
+        ligne = cohortes['lignes'].get((identifiant, str(saison)))
+        if ligne is not None and df['Minutes jouées'].iat[ligne] >= minutes_min:
+            return position
+    return 0
+
+
+def comparer_joueurs(df, cohortes, selection, minutes_min=MINUTES_MIN_COHORTE):
+    """Métriques par 90 minutes et rangs centiles de joueurs/saisons dans leur cohorte
+
+    selection est une liste de (ID_joueur, saison). Renvoie un DataFrame avec une ligne par
+    élément : ID_joueur, Name, Saison, Position, Minutes jouées, cohorte de référence
+    (Référence, voir cohorte_joueur) et sa taille, puis chaque métrique et son centile
+    (colonne '<métrique>_centile'). Une saison de moins de minutes_min minutes, exclue des
+    cohortes, n'est pas classée : centiles NaN et Référence « Hors cohorte ».
+    """
+    resultats = []
+    for identifiant, saison in selection:
+        ligne = cohortes['lignes'].get((identifiant, str(saison)))
+        if ligne is None:
+            continue
+        position = df['Position'].iat[ligne]
+        minutes = df['Minutes jouées'].iat[ligne]
+        if minutes >= minutes_min:
+            reference, tries = cohorte_joueur(cohortes, df['Saison'].iat[ligne], position)
+        else:
+            reference, tries = f"Hors cohorte (< {minutes_min} min)", {}
+        valeurs = cohortes['valeurs'].iloc[ligne]
+        resultat = {
+            'ID_joueur': identifiant,
+            'Name': df['Name'].iat[ligne],
+            'Saison': str(saison),
+            'Position': position,
+            'Minutes jouées': minutes,
+            'Référence': reference,
+            'Cohorte': len(tries.get('Buts_90', ())),
+        }
+        for metrique in METRIQUES_COMPARAISON:
+            resultat[metrique] = valeurs[metrique]
+            resultat[f"{metrique}_centile"] = percentile(tries.get(metrique, np.array([])), valeurs[metrique])
+        resultats.append(resultat)
+    colonnes = (['ID_joueur', 'Name', 'Saison', 'Position', 'Minutes jouées', 'Référence', 'Cohorte']
+                + [c for metrique in METRIQUES_COMPARAISON for c in (metrique, f"{metrique}_centile")])
+    return pd.DataFrame(resultats, columns=colonnes)
+
+
+# Caractéristiques des vecteurs de similarité (standardisées ; market_value en log)
+COLONNES_SIMILARITE = ['Buts_90', 'Passes_90', 'Cartons_90', 'Minutes_par_match', 'PPM',
+                       'Matchs', 'Minutes jouées', 'market_value', 'Age']
+# Nombre de joueurs similaires renvoyés
+SIMILAIRES_TOP_K = 10
+
+
+def construire_index_similarite(df, cohortes, minutes_min=MINUTES_MIN_COHORTE):
+    """Index des vecteurs joueur/saison pour la recherche des plus proches voisins
+
+    Chaque ligne de df devient un vecteur standardisé (moyenne 0, écart-type 1 sur les lignes
+    éligibles, manquants à la moyenne). Les lignes éligibles (au moins `minutes_min` minutes)
+    sont rangées par position dans une matrice float32 contiguë avec leurs normes au carré :
+    une recherche filtrée par position porte sur un seul bloc, en un produit matrice-vecteur.
+    """
+    colonnes = {**cohortes['valeurs'],
+                **{c: df[c] for c in ('Matchs', 'Minutes jouées', 'Age')},
+                'market_value': np.log1p(df['market_value'].astype('float64').clip(lower=0))}
+    brutes = np.column_stack([np.asarray(colonnes[c], dtype='float64') for c in COLONNES_SIMILARITE])
+    eligibles = (df['Minutes jouées'] >= minutes_min).to_numpy()
+    reference = brutes[eligibles] if eligibles.any() else brutes
+    moyennes = np.nanmean(reference, axis=0)
+    ecarts = np.nanstd(reference, axis=0)
+    ecarts = np.where(ecarts > 0, ecarts, 1.0)
+    vecteurs = np.nan_to_num((brutes - moyennes) / ecarts)
+
+    # Lignes éligibles regroupées par position (ordre stable), un bloc contigu par position
+    positions = df['Position'].astype(str).to_numpy()
+    lignes = np.flatnonzero(eligibles)
+    lignes = lignes[np.argsort(positions[lignes], kind='stable')]
+    blocs = {}
+    for position in np.unique(positions[lignes]):
+        debut, fin = np.searchsorted(positions[lignes], position, 'left'), np.searchsorted(positions[lignes], position, 'right')
+        blocs[position] = (int(debut), int(fin))
+    matrice = np.ascontiguousarray(vecteurs[lignes], dtype=np.float32)
+    return {
+        'vecteurs': vecteurs.astype(np.float32),
+        'matrice': matrice,
+        'normes': np.einsum('ij,ij->i', matrice, matrice),
+        'lignes': lignes,
+        'blocs': blocs,
+        'identifiants': df['ID_joueur'].to_numpy()[lignes],
+        'ages': df['Age'].to_numpy(dtype='float64')[lignes],
+    }
+
+
+def joueurs_similaires(df, index_similarite, ligne, k=SIMILAIRES_TOP_K, position=None,
+                       age_min=None, age_max=None):
+    """Les k joueurs/saisons les plus proches de la ligne `ligne` de df (distance euclidienne)
+
+    position restreint la recherche à un poste (bloc de l'index) ; age_min et age_max
+    filtrent sur l'âge, et écartent alors les âges inconnus (None : pas de filtre). Les autres
+    saisons du joueur lui-même sont exclues. Renvoie un
+    DataFrame trié par distance croissante, avec une similarité de 0 à 100.
+    """
+    debut, fin = index_similarite['blocs'].get(position, (0, 0)) if position is not None \
+        else (0, len(index_similarite['lignes']))
+    matrice = index_similarite['matrice'][debut:fin]
+    requete = index_similarite['vecteurs'][ligne]
+    # Distances au carré : ‖x‖² - 2 x·q + ‖q‖² (un seul produit matrice-vecteur, BLAS)
+    distances = index_similarite['normes'][debut:fin] - 2 * (matrice @ requete) + requete @ requete
+    masque = index_similarite['identifiants'][debut:fin] != df['ID_joueur'].iat[ligne]
+    ages = index_similarite['ages'][debut:fin]
+    if age_min is not None:
+        masque &= ages >= age_min
+    if age_max is not None:
+        masque &= ages <= age_max
+    candidats = np.flatnonzero(masque)
+    if len(candidats) > k:
+        candidats = candidats[np.argpartition(distances[candidats], k)[:k]]
+    candidats = candidats[np.argsort(distances[candidats], kind='stable')]
+
+    lignes = index_similarite['lignes'][debut:fin][candidats]
+    distance = np.sqrt(np.maximum(distances[candidats], 0)).astype('float64')
+    similaires = df.iloc[lignes][['Name', 'Saison', 'Position', 'Age', 'Matchs', 'Buts',
+                                  'Passes décisives', 'Minutes jouées', 'market_value']].reset_index(drop=True)
+    similaires.insert(0, 'Similarité', 100 / (1 + distance))
+    similaires['Distance'] = distance
+    return similaires
+
+# Nombre de résultats de la recherche de joueurs
+RECHERCHE_TOP_K = 20
+
+
+def normaliser_nom(nom):
+    """Nom sans accents, en minuscules, ponctuation remplacée par des espaces ('Élkaâbi' -> 'elkaabi')"""
+    texte = unicodedata.normalize('NFKD', str(nom))
+    texte = ''.join(c for c in texte if not unicodedata.combining(c)).lower()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', texte).split())
+
+
+def trigrammes(cle):
+    """Trigrammes d'une clé compacte, bornée par '$' ('kaabi' -> {'$ka', 'kaa', ..., 'bi$'})"""
+    cle = f"${cle}$"
+    return {cle[i:i + 3] for i in range(len(cle) - 2)}
+
+
+def debuts_mots(nom_normalise):
+    """Positions de début de chaque mot dans la clé compacte ('el kaabi' -> [0, 2])"""
+    debuts = []
+    position = 0
+    for mot in nom_normalise.split(' '):
+        debuts.append(position)
+        position += len(mot)
+    return debuts
+
+
+def construire_index_noms(df):
+    """Index de recherche des joueurs : index inversé de trigrammes et suffixes triés
+
+    Chaque orthographe rencontrée d'un nom est indexée avec l'identifiant de son joueur.
+    La clé compacte ignore accents, casse et espaces : 'El Kaabi' et 'Elkaabi' ont la même clé.
+    Les suffixes de la clé commençant à un début de mot sont triés : les noms dont un mot
+    commence par la requête forment une plage, trouvée par recherche dichotomique.
+    """
+    paires = (df[['Name', 'ID_joueur']].dropna().astype({'Name': str})
+              .drop_duplicates().sort_values(['Name', 'ID_joueur']))
+    noms = paires['Name'].to_numpy(dtype=object)
+    normalises = [normaliser_nom(nom) for nom in noms]
+    cles = [nom.replace(' ', '') for nom in normalises]
+    postings = {}
+    nb_trigrammes = np.empty(len(noms), dtype=np.int32)
+    suffixes = []
+    for i, (cle, nom) in enumerate(zip(cles, normalises)):
+        tri = trigrammes(cle)
+        nb_trigrammes[i] = len(tri)
+        for t in tri:
+            postings.setdefault(t, []).append(i)
+        suffixes.extend((cle[debut:], i) for debut in debuts_mots(nom))
+    suffixes.sort()
+    identifiants = paires['ID_joueur'].to_numpy()
+    return {
+        'noms': noms,
+        'identifiants': identifiants,
+        # Joueurs par ordre alphabétique, renvoyés sans requête
+        'alphabetique': pd.unique(identifiants),
+        'cles': cles,
+        'trigrammes': {t: np.array(ids, dtype=np.int32) for t, ids in postings.items()},
+        'nb_trigrammes': nb_trigrammes,
+        # Suffixes de clé à chaque début de mot (prénom, nom...), triés, et le nom de chacun
+        'suffixes': np.array([suffixe for suffixe, _ in suffixes], dtype=str),
+        'suffixes_noms': np.array([i for _, i in suffixes], dtype=np.int32),
+    }
+
+
+def rechercher_joueurs(index_noms, requete, k=RECHERCHE_TOP_K):
+    """Identifiants des k joueurs dont un nom est le plus proche de la requête, du plus pertinent au moins pertinent
+
+    Le score combine la similarité de Jaccard des trigrammes (tolérante aux fautes et aux
+    variantes d'écriture), un bonus quand la requête est un préfixe du nom ou d'un de ses
+    mots, et un bonus plus faible quand elle apparaît ailleurs dans le nom. Sans requête,
+    renvoie les k premiers joueurs par ordre alphabétique.
+    """
+    cle = normaliser_nom(requete).replace(' ', '')
+    if not cle:
+        return index_noms['alphabetique'][:k].tolist()
+    
+    # Candidats : noms partageant un trigramme (listes inversées) ou dont un mot commence
+    # par la requête (plage des suffixes triés) ; seuls ces noms sont évalués
+    tri = trigrammes(cle)
+    listes = [index_noms['trigrammes'][t] for t in tri if t in index_noms['trigrammes']]
+    avec_trigrammes, communs = np.unique(np.concatenate(listes) if listes else np.empty(0, dtype=np.int32),
+                                         return_counts=True)
+    debut = np.searchsorted(index_noms['suffixes'], cle, side='left')
+    fin = np.searchsorted(index_noms['suffixes'], cle + '\uffff', side='left')
+    prefixes = np.unique(index_noms['suffixes_noms'][debut:fin])
+    candidats = np.union1d(avec_trigrammes, prefixes)
+    
+    nb_communs = np.zeros(len(candidats), dtype=np.float64)
+    nb_communs[np.searchsorted(candidats, avec_trigrammes)] = communs
+    score = nb_communs / (len(tri) + index_noms['nb_trigrammes'][candidats] - nb_communs)
+    score += np.where(np.isin(candidats, prefixes), 0.5, 0.0)
+    cles = index_noms['cles']
+    score += np.array([0.5 if cle in cles[i] else 0.0 for i in candidats])
+    
+    # Tri par score décroissant, puis par ordre alphabétique (ordre de l'index)
+    ordre = candidats[np.lexsort((candidats, -score))]
+    # Un joueur apparaît une fois, au rang de sa meilleure orthographe
+    return list(dict.fromkeys(index_noms['identifiants'][ordre].tolist()))[:k]
+
+# Jeu de données versionné : DataFrame chargé et structures dérivées, construits ensemble
+JeuDeDonnees = namedtuple('JeuDeDonnees', [
+    'version', 'df', 'rapport', 'index', 'cube', 'records', 'retention', 'stats_correlation',
+    'joueurs', 'noms', 'carrieres', 'cohortes', 'similarite'
+])
+# Intervalle de scrutation du dossier des données, en secondes (WYDAD_REFRESH_SECONDES)
+REFRESH_SECONDES = float(os.environ.get('WYDAD_REFRESH_SECONDES', 30))
+
+
+def construire_jeu(signature, base_path=DATA_DIR, snapshot_path=SNAPSHOT_PATH, workers=LOAD_WORKERS):
+    """Charge les données d'une signature et construit toutes les structures dérivées"""
+    with instrumentation.mesure('donnees'):
+        df, rapport = charger_donnees(signature, base_path, snapshot_path, workers)
+    return preparer_jeu(df, rapport)
+
+
+def jeu_partage(snapshot_path):
+    """Jeu construit sur le snapshot publié, mappé sans copie, ou None s'il est absent ou obsolète"""
+    with instrumentation.mesure('donnees'):
+        snapshot = lire_snapshot(snapshot_path)
+    if snapshot is None:
+        return None
+    df, segments, rapport = snapshot
+    # Même identifiant de version que le processus qui a publié le snapshot
+    return preparer_jeu(df, {**rapport, 'version': version_donnees(list(segments), rapport['identites']),
+                             'alertes': []})
+
+
+def signature_snapshot(snapshot_path):
+    """Signature (inode, mtime, taille) du snapshot publié, ou None s'il est absent"""
+    try:
+        stat = os.stat(snapshot_path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def preparer_jeu(df, rapport):
+    """Construit les structures dérivées d'un DataFrame chargé
+
+    Avec l'instrumentation, la durée totale est mesurée sous 'preparation' et celle de chaque
+    structure sous 'preparation.<champ>'.
+    """
+    def etape(nom, fonction, *args):
+        with instrumentation.mesure(f"preparation.{nom}"):
+            return fonction(*args)
+
+    with instrumentation.mesure('preparation'):
+        index = etape('index', construire_index, df)
+        joueurs = etape('joueurs', table_joueurs, df)
+        cube = etape('cube', construire_cube, df, joueurs)
+        cohortes = etape('cohortes', construire_cohortes, df, index)
+        return JeuDeDonnees(
+            version=rapport['version'],
+            df=df,
+            rapport=rapport,
+            index=index,
+            cube=cube,
+            records=etape('records', calculer_records, df, cube),
+            retention=etape('retention', calculer_retention, df),
+            stats_correlation=etape('stats_correlation', construire_stats_correlation, df, index),
+            joueurs=joueurs,
+            noms=etape('noms', construire_index_noms, df),
+            carrieres=etape('carrieres', calculer_carrieres, df, joueurs),
+            cohortes=cohortes,
+            similarite=etape('similarite', construire_index_similarite, df, cohortes),
+        )
+
+
+class Rafraichisseur:
+    """Recharge le jeu de données en arrière-plan quand les fichiers de saison changent
+
+    Un thread scrute base_path (fichiers de saison et table des identifiants) toutes les
+    `intervalle` secondes ; à chaque changement de signature, le nouveau jeu est construit hors du chemin des requêtes puis substitué
+    d'un bloc à l'ancien. courant() renvoie toujours un jeu complet : seul le premier
+    chargement est bloquant. En cas d'échec (exception, ou aucun fichier lisible), la version
+    précédente reste servie et derniere_erreur (avec date_erreur, horodatage time.time())
+    décrit l'échec jusqu'au prochain rechargement réussi. Chaque rechargement est compté
+    par wydad_instrumentation, avec sa durée et son erreur.
+    
+    En mode partagé, c'est le snapshot publié par le processus chargeur (publier()) qui est
+    scruté et mappé sans copie ; les CSV ne sont lus que si aucun snapshot n'est disponible.
+    """
+
+    def __init__(self, base_path=DATA_DIR, intervalle=REFRESH_SECONDES, partage=DONNEES_PARTAGEES):
+        self.base_path = base_path
+        self.snapshot_path = chemin_snapshot(base_path)
+        self.intervalle = intervalle
+        self.partage = partage
+        self.jeu = None
+        self.signature = None
+        self.derniere_erreur = None
+        self.date_erreur = None
+        # Une seule reconstruction à la fois (thread de scrutation ou premier chargement)
+        self.verrou = threading.Lock()
+        self.arret = threading.Event()
+        self.thread = None
+
+    def courant(self):
+        """Jeu de données le plus récent (le premier appel attend le chargement initial)"""
+        if self.jeu is None:
+            self.rafraichir()
+            if self.jeu is None:
+                raise self.derniere_erreur
+        return self.jeu
+
+    def rafraichir(self):
+        """Reconstruit le jeu si les fichiers ont changé ; renvoie True si une nouvelle version est servie"""
+        with self.verrou:
+            if self.partage:
+                signature = signature_snapshot(self.snapshot_path)
+            else:
+                signature = (signature_sources(self.base_path), signature_identites(self.base_path))
+            if signature == self.signature and self.jeu is not None:
+                return False
+            debut = time.perf_counter()
+            try:
+                jeu = jeu_partage(self.snapshot_path) if self.partage else None
+                if jeu is None:
+                    jeu = construire_jeu(signature_sources(self.base_path), self.base_path, self.snapshot_path)
+            except Exception as e:
+                self.echec(e, debut)
+                return False
+            if 'erreur' in jeu.rapport:
+                # Jeu d'exemple : aucun fichier lisible
+                self.echec(RuntimeError(jeu.rapport['erreur']), debut)
+            else:
+                self.derniere_erreur = None
+                self.date_erreur = None
+                instrumentation.enregistrer_rafraichissement(time.perf_counter() - debut)
+            # Le jeu d'exemple n'est pas rattaché à la signature : on réessaie au prochain passage
+            if jeu.version == 'exemple':
+                self.signature = None
+            elif self.partage:
+                self.signature = signature
+            else:
+                # Table des identifiants telle que ce chargement l'a écrite : pas de rechargement en écho
+                self.signature = (signature[0], jeu.rapport['identites'])
+            if self.jeu is not None and jeu.version == 'exemple':
+                return False
+            # Substitution d'un bloc : les reruns en cours gardent leur référence à l'ancien jeu
+            self.jeu = jeu
+            return True
+
+    def echec(self, erreur, debut):
+        """Retient et compte un rechargement échoué"""
+        self.derniere_erreur = erreur
+        self.date_erreur = time.time()
+        instrumentation.enregistrer_rafraichissement(time.perf_counter() - debut, f"{type(erreur).__name__}: {erreur}")
+
+    def _boucle(self):
+        while not self.arret.wait(self.intervalle):
+            self.rafraichir()
+
+    def demarrer(self):
+        """Démarre la scrutation dans un thread démon (idempotent)"""
+        if self.thread is None or not self.thread.is_alive():
+            self.arret.clear()
+            self.thread = threading.Thread(target=self._boucle, name='wydad-rafraichissement', daemon=True)
+            self.thread.start()
+        return self
+
+    def arreter(self):
+        self.arret.set()
+
+
+def publier(base_path=DATA_DIR, intervalle=REFRESH_SECONDES):
+    """Processus chargeur du mode partagé : maintient le snapshot à jour à partir des CSV
+
+    Les processus du dashboard lancés avec WYDAD_DONNEES_PARTAGEES=1 mappent ce snapshot.
+    """
+    snapshot_path = chemin_snapshot(base_path)
+    signature = None
+    while True:
+        nouvelle = (signature_sources(base_path), signature_identites(base_path))
+        if nouvelle != signature:
+            df, rapport = charger_donnees(nouvelle[0], base_path, snapshot_path)
+            for _, message in rapport['alertes']:
+                print(message, flush=True)
+            if 'erreur' in rapport:
+                # Rien à publier : nouvel essai au prochain passage
+                print(f"❌ Aucune donnée publiée: {rapport['erreur']}", flush=True)
+            else:
+                print(f"Snapshot {rapport['version']} publié : {len(df)} lignes → {snapshot_path}", flush=True)
+                signature = (nouvelle[0], rapport['identites'])
+        time.sleep(intervalle)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Publie le snapshot partagé des données du Wydad")
+    parser.add_argument('--donnees', default=DATA_DIR)
+    parser.add_argument('--intervalle', type=float, default=REFRESH_SECONDES)
+    args = parser.parse_args()
+    publier(args.donnees, args.intervalle)
@@ -1,10 +1,17 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 from plotly.subplots import make_subplots
 import os
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import wydad_analytics as analytics
+import wydad_instrumentation as instrumentation
 
 # Configuration de la page
 st.set_page_config(
@@ -110,101 +117,188 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Fonction pour charger les données
-@st.cache_data
+# Les analyses sont dans wydad_analytics (sans Streamlit) ; l'application les met en cache.
+# cache_resource : les résultats sont partagés en lecture seule entre les reruns et les sessions,
+# sans la copie (pickle) que cache_data ferait à chaque accès. Les sélections par filtre sont
+# mémoïsées par version du jeu de données.
+@st.cache_resource
+def rafraichisseur():
+    """Jeu de données partagé, rechargé en arrière-plan quand un fichier de data/ change"""
+    return analytics.Rafraichisseur(analytics.DATA_DIR).demarrer()
+
+
 def load_data():
-    """Charge et prépare les données du Wydad"""
-    try:
-        # Chemin de base (relatif pour compatibilité Cloud & Local)
-        base_path = 'data'
-        
-        # Liste des fichiers à charger
-        files = [
-            'Merged_WYDAD_201112.csv',
-            'Merged_WYDAD_201213.csv',
-            'Merged_WYDAD_201314.csv',
-            'Merged_WYDAD_201415.csv',
-            'Merged_WYDAD_201516.csv',
-            'Merged_WYDAD_201617.csv',
-            'Merged_WYDAD_201718.csv',
-            'Merged_WYDAD_201819.csv',
-            'Merged_WYDAD_201920.csv',
-            'Merged_WYDAD_202021.csv',
-            'Merged_WYDAD_202122.csv',
-            'Merged_WYDAD_202223.csv',
-            'Merged_WYDAD_202324.csv',
-            'Merged_WYDAD_202425.csv'
-        ]
-        
-        # Charger tous les fichiers
-        dfs = []
-        for file in files:
-            file_path = os.path.join(base_path, file)
-            try:
-                df_temp = pd.read_csv(file_path, encoding='utf-8')
-                dfs.append(df_temp)
-                # st.sidebar.success(f"✅ {file} chargé")
-            except FileNotFoundError:
-                st.sidebar.warning(f"⚠️ Fichier non trouvé: {file}")
-            except Exception as e:
-                st.sidebar.error(f"❌ Erreur avec {file}: {str(e)}")
-        
-        if dfs:
-            df = pd.concat(dfs, ignore_index=True)
-            # st.sidebar.success(f"✅ Total: {len(df)} enregistrements chargés")
-        else:
-            raise FileNotFoundError("Aucun fichier trouvé")
-            
-    except Exception as e:
-        st.error(f"⚠️ Erreur: {str(e)}")
-        st.info("📊 Utilisation de données d'exemple pour la démonstration")
-        
-        # Données d'exemple
-        data = {
-            'Name': ['Nadir Lamyaghri', 'Mourad Lemsen', 'Youssef Rabeh', 'Hicham Amrani', 
-                     'Ayoub El Kaabi', 'Yahya Jabrane', 'Walid El Karti'] * 15,
-            'Position': ['Gardien de but', 'Défense', 'Défenseur central', 'Défenseur central',
-                        'Avant-centre', 'Milieu central', 'Ailier droit'] * 15,
-            'Age': [34, 31, 26, 25, 28, 27, 24] * 15,
-            'Matchs': [21, 25, 23, 24, 30, 28, 20] * 15,
-            'Buts': [0, 1, 0, 1, 15, 5, 8] * 15,
-            'Passes décisives': [0, 2, 0, 1, 3, 8, 6] * 15,
-            'Minutes jouées': [1890, 2245, 2070, 2147, 2700, 2520, 1800] * 15,
-            'Cartons Jaunes': [0, 6, 2, 8, 3, 4, 2] * 15,
-            'CartonS rouges': [0, 0, 0, 0, 0, 1, 0] * 15,
-            'market_value': [275000, 150000, 200000, 180000, 800000, 600000, 450000] * 15,
-            'Saison': ['2011/12', '2012/13', '2013/14', '2014/15', '2015/16', 
-                      '2016/17', '2017/18', '2018/19', '2019/20', '2020/21',
-                      '2021/22', '2022/23', '2023/24', '2024/25', '2011/12'] * 7,
-            'PPM': [1.90, 1.68, 1.65, 1.58, 2.10, 1.95, 1.75] * 15
-        }
-        df = pd.DataFrame(data)
-    
-    # Nettoyer et convertir les colonnes numériques
-    numeric_cols = ['Age', 'Matchs', 'Buts', 'Passes décisives', 'Minutes jouées', 
-                    'Cartons Jaunes', 'CartonS rouges', 'market_value', 'PPM']
-    
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    # Remplacer les NaN par 0 pour certaines colonnes
-    df['Buts'] = df['Buts'].fillna(0)
-    df['Passes décisives'] = df['Passes décisives'].fillna(0)
-    df['Cartons Jaunes'] = df['Cartons Jaunes'].fillna(0)
-    df['CartonS rouges'] = df['CartonS rouges'].fillna(0)
-    df['market_value'] = df['market_value'].fillna(0)
-    
-    # Ajouter des colonnes calculées
-    df['Ratio_Buts_Matchs'] = df['Buts'] / df['Matchs'].replace(0, np.nan)
-    df['Minutes_par_match'] = df['Minutes jouées'] / df['Matchs'].replace(0, np.nan)
-    df['Contributions_offensives'] = df['Buts'] + df['Passes décisives']
-    df['Cartons_total'] = df['Cartons Jaunes'] + df['CartonS rouges']
-    
-    return df
+    """Version courante du jeu de données (df, rapport et structures dérivées), sans attente de rechargement"""
+    return rafraichisseur().courant()
+
+
+@instrumentation.suivre_cache('filtre_donnees', st.cache_resource(max_entries=64))
+def filtrer_donnees(_df, _index, version, saison, position):
+    return analytics.filtrer_donnees(_df, _index, saison, position)
+
+
+@instrumentation.suivre_cache('filtre_cube', st.cache_resource(max_entries=64))
+def filtrer_cube(_cube, version, saison, position):
+    return analytics.filtrer_cube(_cube, saison, position)
+
+
+@instrumentation.suivre_cache('correlation_pearson', st.cache_resource(max_entries=64))
+def correlation_pearson(_stats, version, saison, position):
+    return analytics.correlation_pearson(_stats, saison, position)
+
+
+@instrumentation.suivre_cache('correlation_spearman', st.cache_resource(max_entries=64))
+def correlation_spearman(_df_filtered, version, saison, position):
+    return analytics.correlation_spearman(_df_filtered)
+
+# Seuil de rendu WebGL des nuages de points
+SEUIL_WEBGL = 1000
+
+
+def mode_rendu(nb_points):
+    """Rendu WebGL (Scattergl) au-delà du seuil, SVG en dessous"""
+    return 'webgl' if nb_points > SEUIL_WEBGL else 'svg'
+
+# Instrumentation (WYDAD_INSTRUMENTATION=1) : point d'export Prometheus démarré une fois par processus
+@st.cache_resource
+def serveur_metriques():
+    return instrumentation.demarrer_serveur()
+
+
+serveur_metriques()
+instrumentation.debut_rerun()
 
 # Chargement des données
-df = load_data()
+with instrumentation.mesure('chargement'):
+    jeu = load_data()
+df, rapport_chargement = jeu.df, jeu.rapport
+if 'erreur' in rapport_chargement:
+    st.error(f"⚠️ Erreur: {rapport_chargement['erreur']}")
+    st.info("📊 Utilisation de données d'exemple pour la démonstration")
+index_donnees = jeu.index
+cube_donnees = jeu.cube
+records_donnees = jeu.records
+stats_correlation = jeu.stats_correlation
+index_noms = jeu.noms
+joueurs_donnees = jeu.joueurs
+carrieres_donnees = jeu.carrieres
+cohortes_donnees = jeu.cohortes
+similarite_donnees = jeu.similarite
+
+
+def nom_joueur(identifiant):
+    """Nom canonique d'un joueur (orthographe la plus récente)"""
+    return joueurs_donnees.at[identifiant, 'Name']
+
+
+def choisir_joueur(libelle, key):
+    """Recherche côté serveur : seuls les meilleurs résultats sont envoyés au navigateur
+
+    Renvoie l'identifiant du joueur choisi, ou None.
+    """
+    requete = st.text_input(f"{libelle} — recherche", key=f"{key}_recherche",
+                            placeholder="Nom du joueur (ex. Elkaabi)")
+    resultats = analytics.rechercher_joueurs(index_noms, requete)
+    if not resultats:
+        st.caption("Aucun joueur trouvé")
+        return None
+    return st.selectbox(libelle, resultats, format_func=nom_joueur, key=key)
+
+
+def onglets(libelles, key):
+    """Onglets à exécution paresseuse : seul l'onglet affiché est calculé à chaque rerun"""
+    return st.tabs(libelles, key=key, on_change='rerun')
+
+
+def rendre_onglet(onglet, fragment, *args):
+    """Exécute le fragment d'un onglet uniquement s'il est affiché"""
+    with onglet:
+        if onglet.open is not False:
+            fragment(*args)
+
+# Cache des figures : taille cumulée maximale des specs JSON (WYDAD_FIGURES_CACHE_MO, en Mo)
+FIGURES_CACHE_MAX_OCTETS = int(os.environ.get('WYDAD_FIGURES_CACHE_MO', 64)) * 1024 * 1024
+
+
+class CacheFigures:
+    """Cache LRU de figures Plotly borné par la taille de leur spec JSON
+
+    Les figures sont conservées construites : Streamlit les re-sérialise à chaque
+    affichage, et reconstruire une figure depuis sa spec JSON coûte plus cher que
+    la relire. Le cache est partagé entre sessions ; les figures ne doivent pas être modifiées.
+    """
+
+    def __init__(self, max_octets):
+        self.max_octets = max_octets
+        self.octets = 0
+        self.entrees = OrderedDict()
+        self.verrou = threading.Lock()
+
+    def lire(self, cle):
+        with self.verrou:
+            entree = self.entrees.get(cle)
+            if entree is None:
+                return None
+            self.entrees.move_to_end(cle)
+            return entree[0]
+
+    def taille(self, cle):
+        """Taille (octets) de la spec JSON d'une figure en cache, ou None"""
+        with self.verrou:
+            entree = self.entrees.get(cle)
+            return entree[1] if entree is not None else None
+
+    def ecrire(self, cle, figure):
+        taille = len(pio.to_json(figure, validate=False))
+        if taille > self.max_octets:
+            return
+        with self.verrou:
+            if cle in self.entrees:
+                self.octets -= self.entrees.pop(cle)[1]
+            self.entrees[cle] = (figure, taille)
+            self.octets += taille
+            # Éviction des figures les moins récemment affichées
+            while self.octets > self.max_octets:
+                _, (_, taille_evincee) = self.entrees.popitem(last=False)
+                self.octets -= taille_evincee
+
+
+@st.cache_resource
+def cache_figures():
+    return CacheFigures(FIGURES_CACHE_MAX_OCTETS)
+
+
+def empreinte(*donnees):
+    """Empreinte des données d'entrée d'un graphique (contenu, index et noms de colonnes)"""
+    h = hashlib.blake2b(digest_size=16)
+    for valeur in donnees:
+        if isinstance(valeur, (pd.DataFrame, pd.Series)):
+            h.update(pd.util.hash_pandas_object(valeur, index=True).to_numpy().tobytes())
+            noms = valeur.columns.tolist() if isinstance(valeur, pd.DataFrame) else valeur.name
+            h.update(repr(noms).encode())
+        else:
+            h.update(repr(valeur).encode())
+    return h.hexdigest()
+
+
+def afficher_graphique(id_graphique, construire, *donnees):
+    """Affiche la figure construire(*donnees), mémoïsée par (graphique, empreinte des données)"""
+    with instrumentation.mesure(f"graphique.{id_graphique}"):
+        cache = cache_figures()
+        cle = (id_graphique, empreinte(*donnees))
+        figure = cache.lire(cle)
+        instrumentation.enregistrer_cache('figures', figure is None)
+        if figure is None:
+            with instrumentation.mesure(f"graphique.{id_graphique}.construction"):
+                figure = construire(*donnees)
+            cache.ecrire(cle, figure)
+        with instrumentation.mesure(f"graphique.{id_graphique}.envoi"):
+            st.plotly_chart(figure, use_container_width=True)
+        if instrumentation.ACTIF:
+            # Volume envoyé au navigateur : taille de la spec JSON de la figure
+            octets = cache.taille(cle)
+            instrumentation.enregistrer_octets(
+                id_graphique, octets if octets is not None else len(pio.to_json(figure, validate=False)))
 
 # En-tête de l'application
 col_logo, col_title = st.columns([1, 4])
@@ -225,6 +319,13 @@ st.markdown("---")
 # Sidebar pour la navigation
 with st.sidebar:
     st.markdown("## 🔴 WYDAD AC")
+    
+    # Dernier rechargement en arrière-plan échoué : la version précédente reste affichée
+    erreur_rechargement, date_erreur = rafraichisseur().derniere_erreur, rafraichisseur().date_erreur
+    if erreur_rechargement is not None:
+        heure = time.strftime('%H:%M:%S', time.localtime(date_erreur)) if date_erreur else "?"
+        st.warning(f"⚠️ Échec du rechargement des données ({heure}) : {erreur_rechargement}. "
+                   f"La version précédente reste affichée.")
     st.markdown("## 📊 Navigation")
     
     page = st.radio(
@@ -240,20 +341,35 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("### ⚙️ Filtres")
     
-    # Filtre par saison
-    saisons = ['Toutes'] + sorted(df['Saison'].unique().tolist())
-    saison_selectionnee = st.selectbox("Saison", saisons)
+    with instrumentation.mesure('filtres'):
+        # Filtre par saison
+        saisons = ['Toutes'] + sorted(df['Saison'].unique().tolist())
+        saison_selectionnee = st.selectbox("Saison", saisons)
+        
+        # Filtre par position
+        positions = ['Toutes'] + sorted(df['Position'].unique().tolist())
+        position_selectionnee = st.selectbox("Position", positions)
+        
+        # Appliquer les filtres (sélection mémoïsée, partagée entre les reruns)
+        df_filtered = filtrer_donnees(df, index_donnees, rapport_chargement['version'],
+                                      saison_selectionnee, position_selectionnee)
+        cube_filtered = filtrer_cube(cube_donnees, rapport_chargement['version'],
+                                     saison_selectionnee, position_selectionnee)
     
-    # Filtre par position
-    positions = ['Toutes'] + sorted(df['Position'].unique().tolist())
-    position_selectionnee = st.selectbox("Position", positions)
+    # Rapport d'ingestion
+    for niveau, message in rapport_chargement['alertes']:
+        getattr(st, niveau)(message)
+    quarantaine = rapport_chargement['quarantaine']
+    if not quarantaine.empty:
+        with st.expander(f"⚠️ {len(quarantaine)} anomalie(s) à l'ingestion"):
+            st.dataframe(quarantaine, hide_index=True, use_container_width=True)
+    memoire_avant, memoire_apres = rapport_chargement['memoire']
+    st.caption(f"💾 {len(df)} lignes · mémoire {memoire_avant / 1024:.0f} Ko → {memoire_apres / 1024:.0f} Ko")
     
-    # Appliquer les filtres
-    df_filtered = df.copy()
-    if saison_selectionnee != 'Toutes':
-        df_filtered = df_filtered[df_filtered['Saison'] == saison_selectionnee]
-    if position_selectionnee != 'Toutes':
-        df_filtered = df_filtered[df_filtered['Position'] == position_selectionnee]
+    # Panneau d'instrumentation, rempli en fin de rerun
+    panneau_instrumentation = st.empty() if instrumentation.ACTIF else None
+
+span_page = instrumentation.demarrer(f"page.{page}")
 
 # PAGE 1: TABLEAU DE BORD
 if page == "🏠 Tableau de Bord":
@@ -268,7 +384,7 @@ if page == "🏠 Tableau de Bord":
                 <div class="stat-number">{}</div>
                 <div class="stat-label">Joueurs Total</div>
             </div>
-        """.format(df_filtered['Name'].nunique()), unsafe_allow_html=True)
+        """.format(df_filtered['ID_joueur'].nunique()), unsafe_allow_html=True)
     
     with col2:
         st.markdown("""
@@ -302,124 +418,121 @@ if page == "🏠 Tableau de Bord":
     
     with col1:
         # Distribution par position
-        pos_counts = df_filtered['Position'].value_counts().reset_index()
-        pos_counts.columns = ['Position', 'count']
-        
-        fig_positions = px.pie(
-            pos_counts,
-            values='count',
-            names='Position',
-            title="Répartition des Joueurs par Position",
-            color_discrete_sequence=px.colors.sequential.Reds
-        )
-        fig_positions.update_layout(
-            height=400,
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)'
-        )
-        st.plotly_chart(fig_positions, use_container_width=True)
+        pos_counts = analytics.repartition_positions(df_filtered)
+        
+        def figure_positions(pos_counts):
+            fig_positions = px.pie(
+                pos_counts,
+                values='count',
+                names='Position',
+                title="Répartition des Joueurs par Position",
+                color_discrete_sequence=px.colors.sequential.Reds
+            )
+            fig_positions.update_layout(
+                height=400,
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)'
+            )
+            return fig_positions
+        afficher_graphique('repartition_positions', figure_positions, pos_counts)
     
     with col2:
         # Distribution des âges
-        fig_ages = px.histogram(
-            df_filtered,
-            x='Age',
-            title="Distribution des Âges",
-            nbins=15,
-            color_discrete_sequence=['#E61717']
-        )
-        fig_ages.update_layout(
-            height=400,
-            showlegend=False,
-            xaxis_title="Âge",
-            yaxis_title="Nombre de joueurs",
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)'
-        )
-        st.plotly_chart(fig_ages, use_container_width=True)
+        def figure_ages(df_filtered):
+            fig_ages = px.histogram(
+                df_filtered,
+                x='Age',
+                title="Distribution des Âges",
+                nbins=15,
+                color_discrete_sequence=['#E61717']
+            )
+            fig_ages.update_layout(
+                height=400,
+                showlegend=False,
+                xaxis_title="Âge",
+                yaxis_title="Nombre de joueurs",
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)'
+            )
+            return fig_ages
+        afficher_graphique('distribution_ages', figure_ages, df_filtered[['Age']])
     
     # Évolution par saison
     st.markdown("### 📈 Évolution par Saison")
     
-    evol_saison = df.groupby('Saison').agg({
-        'Buts': 'sum',
-        'Passes décisives': 'sum',
-        'Minutes jouées': 'sum'
-    }).reset_index()
+    evol_saison = analytics.evolution_saisons(cube_donnees)
     
-    fig_evolution = make_subplots(
-        rows=1, cols=3,
-        subplot_titles=('Buts', 'Passes Décisives', 'Minutes Jouées')
-    )
+    def figure_evolution(evol_saison):
+        fig_evolution = make_subplots(
+            rows=1, cols=3,
+            subplot_titles=('Buts', 'Passes Décisives', 'Minutes Jouées')
+        )
     
-    fig_evolution.add_trace(
-        go.Bar(x=evol_saison['Saison'], y=evol_saison['Buts'], 
-               marker_color='#E61717', name='Buts'),
-        row=1, col=1
-    )
+        fig_evolution.add_trace(
+            go.Bar(x=evol_saison['Saison'], y=evol_saison['Buts'], 
+                   marker_color='#E61717', name='Buts'),
+            row=1, col=1
+        )
     
-    fig_evolution.add_trace(
-        go.Bar(x=evol_saison['Saison'], y=evol_saison['Passes décisives'], 
-               marker_color='#D4AF37', name='Passes'),
-        row=1, col=2
-    )
+        fig_evolution.add_trace(
+            go.Bar(x=evol_saison['Saison'], y=evol_saison['Passes décisives'], 
+                   marker_color='#D4AF37', name='Passes'),
+            row=1, col=2
+        )
     
-    fig_evolution.add_trace(
-        go.Bar(x=evol_saison['Saison'], y=evol_saison['Minutes jouées'], 
-               marker_color='#1A1A1A', name='Minutes'),
-        row=1, col=3
-    )
+        fig_evolution.add_trace(
+            go.Bar(x=evol_saison['Saison'], y=evol_saison['Minutes jouées'], 
+                   marker_color='#1A1A1A', name='Minutes'),
+            row=1, col=3
+        )
     
-    fig_evolution.update_layout(
-        height=400,
-        showlegend=False,
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        font={'family': 'Poppins'}
-    )
+        fig_evolution.update_layout(
+            height=400,
+            showlegend=False,
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)',
+            font={'family': 'Poppins'}
+        )
     
-    # Update des couleurs des barres
-    fig_evolution.data[0].marker.color = '#E61717' # Buts
-    fig_evolution.data[1].marker.color = '#D4AF37' # Passes
-    fig_evolution.data[2].marker.color = '#1A1A1A' # Minutes
-
-    st.plotly_chart(fig_evolution, use_container_width=True)
+        # Update des couleurs des barres
+        fig_evolution.data[0].marker.color = '#E61717' # Buts
+        fig_evolution.data[1].marker.color = '#D4AF37' # Passes
+        fig_evolution.data[2].marker.color = '#1A1A1A' # Minutes
+        return fig_evolution
+    afficher_graphique('evolution_saisons', figure_evolution, evol_saison)
 
 # PAGE 2: PERFORMANCES
 elif page == "📈 Performances":
     st.markdown("## 📈 Analyses de Performances")
     
-    tab1, tab2, tab3 = st.tabs(["⚽ Attaque", "🛡️ Défense", "⏱️ Temps de Jeu"])
+    tab1, tab2, tab3 = onglets(["⚽ Attaque", "🛡️ Défense", "⏱️ Temps de Jeu"], key="onglets_performances")
     
-    with tab1:
+    @st.fragment
+    def onglet_attaque(df_filtered, cube_filtered):
         st.markdown("### ⚽ Top Buteurs")
         
         col1, col2 = st.columns([2, 1])
         
         with col1:
-            top_buteurs = df_filtered.groupby('Name').agg({
-                'Buts': 'sum',
-                'Matchs': 'sum',
-                'Position': 'first'
-            }).sort_values('Buts', ascending=False).head(10).reset_index()
+            top_buteurs = analytics.top_buteurs(cube_filtered, 10)
             
-            fig_buteurs = px.bar(
-                top_buteurs,
-                x='Buts',
-                y='Name',
-                orientation='h',
-                title="Top 10 Buteurs",
-                color='Buts',
-                color_continuous_scale=['#FFD700', '#E61717', '#800000']
-            )
-            fig_buteurs.update_layout(height=500)
-            st.plotly_chart(fig_buteurs, use_container_width=True)
+            def figure_buteurs(top_buteurs):
+                fig_buteurs = px.bar(
+                    top_buteurs,
+                    x='Buts',
+                    y='Name',
+                    orientation='h',
+                    title="Top 10 Buteurs",
+                    color='Buts',
+                    color_continuous_scale=['#FFD700', '#E61717', '#800000']
+                )
+                fig_buteurs.update_layout(height=500)
+                return fig_buteurs
+            afficher_graphique('top_buteurs', figure_buteurs, top_buteurs)
         
         with col2:
             st.markdown("#### 🏆 Meilleurs Contributions")
-            top_contrib = df_filtered.nlargest(5, 'Contributions_offensives')[
-                ['Name', 'Buts', 'Passes décisives', 'Contributions_offensives']
-            ]
+            top_contrib = analytics.top_contributions(df_filtered, 5)
             st.dataframe(
                 top_contrib,
                 hide_index=True,
@@ -427,236 +540,297 @@ elif page == "📈 Performances":
                 height=400
             )
     
-    with tab2:
+    @st.fragment
+    def onglet_defense(df_filtered, cube_filtered, saison_selectionnee):
         st.markdown("### 🛡️ Discipline")
         
         col1, col2 = st.columns(2)
         
         with col1:
             # Cartons par position
-            cartons_pos = df_filtered.groupby('Position').agg({
-                'Cartons Jaunes': 'sum',
-                'CartonS rouges': 'sum'
-            }).reset_index()
+            cartons_pos = analytics.cartons_par_position(cube_filtered)
             
-            fig_cartons = go.Figure()
-            fig_cartons.add_trace(go.Bar(
-                name='Cartons Jaunes',
-                x=cartons_pos['Position'],
-                y=cartons_pos['Cartons Jaunes'],
-                marker_color='#FFD700'
-            ))
-            fig_cartons.add_trace(go.Bar(
-                name='Cartons Rouges',
-                x=cartons_pos['Position'],
-                y=cartons_pos['CartonS rouges'],
-                marker_color='#DC143C'
-            ))
-            fig_cartons.update_layout(
-                title="Cartons par Position",
-                barmode='group',
-                height=400
-            )
-            st.plotly_chart(fig_cartons, use_container_width=True)
+            def figure_cartons(cartons_pos):
+                fig_cartons = go.Figure()
+                fig_cartons.add_trace(go.Bar(
+                    name='Cartons Jaunes',
+                    x=cartons_pos['Position'],
+                    y=cartons_pos['Cartons Jaunes'],
+                    marker_color='#FFD700'
+                ))
+                fig_cartons.add_trace(go.Bar(
+                    name='Cartons Rouges',
+                    x=cartons_pos['Position'],
+                    y=cartons_pos['CartonS rouges'],
+                    marker_color='#DC143C'
+                ))
+                fig_cartons.update_layout(
+                    title="Cartons par Position",
+                    barmode='group',
+                    height=400
+                )
+                return fig_cartons
+            afficher_graphique('cartons_position', figure_cartons, cartons_pos)
         
         with col2:
             # Joueurs les plus sanctionnés
             st.markdown("#### 🟨🟥 Joueurs les Plus Sanctionnés")
             
-            cols_cartons = ['Name', 'Cartons Jaunes', 'CartonS rouges', 'Cartons_total']
-            if saison_selectionnee == 'Toutes':
-                cols_cartons.append('Saison')
-                
-            top_cartons = df_filtered.nlargest(10, 'Cartons_total')[cols_cartons]
+            top_cartons = analytics.top_sanctionnes(df_filtered, 10, avec_saison=(saison_selectionnee == 'Toutes'))
             st.dataframe(top_cartons, hide_index=True, use_container_width=True)
     
-    with tab3:
+    @st.fragment
+    def onglet_temps_de_jeu(df_filtered, cube_filtered, saison_selectionnee):
         st.markdown("### ⏱️ Temps de Jeu")
         
         col1, col2 = st.columns(2)
         
         with col1:
             # Minutes par position
-            minutes_pos = df_filtered.groupby('Position')['Minutes jouées'].sum().reset_index()
+            minutes_pos = analytics.minutes_par_position(cube_filtered)
             
-            fig_minutes = px.pie(
-                minutes_pos,
-                values='Minutes jouées',
-                names='Position',
-                title="Répartition des Minutes par Position",
-                color_discrete_sequence=px.colors.sequential.Reds
-            )
-            st.plotly_chart(fig_minutes, use_container_width=True)
+            def figure_minutes(minutes_pos):
+                fig_minutes = px.pie(
+                    minutes_pos,
+                    values='Minutes jouées',
+                    names='Position',
+                    title="Répartition des Minutes par Position",
+                    color_discrete_sequence=px.colors.sequential.Reds
+                )
+                return fig_minutes
+            afficher_graphique('minutes_position', figure_minutes, minutes_pos)
         
         with col2:
             # Top temps de jeu
             st.markdown("#### 🏃 Plus Gros Temps de Jeu")
             
-            cols_minutes = ['Name', 'Position', 'Matchs', 'Minutes jouées', 'Minutes_par_match']
-            if saison_selectionnee == 'Toutes':
-                cols_minutes.append('Saison')
-                
-            top_minutes = df_filtered.nlargest(10, 'Minutes jouées')[cols_minutes]
+            top_minutes = analytics.top_temps_de_jeu(df_filtered, 10, avec_saison=(saison_selectionnee == 'Toutes'))
             st.dataframe(
                 top_minutes.round(1),
                 hide_index=True,
                 use_container_width=True
             )
 
+    # Seul l'onglet affiché est calculé
+    rendre_onglet(tab1, onglet_attaque, df_filtered, cube_filtered)
+    rendre_onglet(tab2, onglet_defense, df_filtered, cube_filtered, saison_selectionnee)
+    rendre_onglet(tab3, onglet_temps_de_jeu, df_filtered, cube_filtered, saison_selectionnee)
+
 # PAGE 3: JOUEURS
 elif page == "👥 Joueurs":
     st.markdown("## 👥 Profils des Joueurs")
     
-    # Recherche de joueur
-    st.markdown("### 🔍 Rechercher un Joueur")
-    joueur_recherche = st.selectbox(
-        "Sélectionner un joueur",
-        sorted(df['Name'].unique())
-    )
+    @st.fragment
+    def section_profil():
+        # Recherche de joueur
+        st.markdown("### 🔍 Rechercher un Joueur")
+        joueur_recherche = choisir_joueur("Sélectionner un joueur", key='joueur')
     
-    if joueur_recherche:
-        joueur_data = df[df['Name'] == joueur_recherche]
+        if joueur_recherche is not None:
+            # Résumé de carrière précalculé : lecture directe, sans agrégation
+            carriere, stats_saison, ppm_saison = analytics.carriere_joueur(carrieres_donnees, joueur_recherche)
+            variantes = joueurs_donnees.at[joueur_recherche, 'Variantes']
+            if len(variantes) > 1:
+                st.caption(f"Orthographes rencontrées : {', '.join(variantes)}")
         
-        # Informations du joueur
-        col1, col2, col3, col4 = st.columns(4)
-        
-        # Calculs de carrière
-        nb_saisons_joueur = joueur_data['Saison'].nunique()
-        saisons_jouees = sorted(joueur_data['Saison'].unique().tolist())
-        periode = f"{saisons_jouees[0]} - {saisons_jouees[-1]}" if len(saisons_jouees) > 1 else saisons_jouees[0]
+            # Informations du joueur
+            col1, col2, col3, col4 = st.columns(4)
 
-        with col1:
-            st.metric("Saisons Disputées", f"{nb_saisons_joueur}")
-            st.caption(f"Période: {periode}")
-        with col2:
-            st.metric("Position", joueur_data['Position'].mode()[0] if len(joueur_data['Position'].mode()) > 0 else "N/A")
-        with col3:
-             total_buts = int(joueur_data['Buts'].sum())
-             meilleure_saison_buts = joueur_data.loc[joueur_data['Buts'].idxmax(), 'Saison'] if total_buts > 0 else "-"
-             st.metric("Total Buts", total_buts)
-             if total_buts > 0:
-                 st.caption(f"Meilleure saison: {meilleure_saison_buts}")
-        with col4:
-            st.metric("Total Passes", int(joueur_data['Passes décisives'].sum()))
-        
-        # Statistiques détaillées
-        col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Saisons Disputées", f"{carriere['Nb_saisons']}")
+                st.caption(f"Période: {carriere['Periode']}")
+            with col2:
+                st.metric("Position", carriere['Position'] if isinstance(carriere['Position'], str) else "N/A")
+            with col3:
+                 total_buts = int(carriere['Buts'])
+                 st.metric("Total Buts", total_buts)
+                 if total_buts > 0:
+                     st.caption(f"Meilleure saison: {carriere['Meilleure_saison_Buts']}")
+            with col4:
+                st.metric("Total Passes", int(carriere['Passes décisives']))
         
-        with col1:
-            st.markdown("#### 📊 Statistiques par Saison")
-            stats_saison = joueur_data.groupby('Saison').agg({
-                'Matchs': 'sum',
-                'Buts': 'sum',
-                'Passes décisives': 'sum',
-                'Minutes jouées': 'sum',
-                'Cartons Jaunes': 'sum'
-            }).reset_index()
-            
-            st.dataframe(stats_saison, hide_index=True, use_container_width=True)
+            # Statistiques détaillées
+            col1, col2 = st.columns(2)
         
-        with col2:
-            # Graphique d'évolution
-            fig_joueur = go.Figure()
-            fig_joueur.add_trace(go.Scatter(
-                x=stats_saison['Saison'],
-                y=stats_saison['Buts'],
-                mode='lines+markers',
-                name='Buts',
-                line=dict(color='#DC143C', width=3)
-            ))
-            fig_joueur.add_trace(go.Scatter(
-                x=stats_saison['Saison'],
-                y=stats_saison['Passes décisives'],
-                mode='lines+markers',
-                name='Passes',
-                line=dict(color='#B22222', width=3)
-            ))
+            with col1:
+                st.markdown("#### 📊 Statistiques par Saison")
+                # Statistiques par saison et moyenne de PPM par saison (si des données sont dispos)
+                st.dataframe(stats_saison, hide_index=True, use_container_width=True)
+        
+            with col2:
+                # Graphique d'évolution
+                def figure_joueur(stats_saison, ppm_saison):
+                    fig_joueur = go.Figure()
+                    fig_joueur.add_trace(go.Scatter(
+                        x=stats_saison['Saison'],
+                        y=stats_saison['Buts'],
+                        mode='lines+markers',
+                        name='Buts',
+                        line=dict(color='#DC143C', width=3)
+                    ))
+                    fig_joueur.add_trace(go.Scatter(
+                        x=stats_saison['Saison'],
+                        y=stats_saison['Passes décisives'],
+                        mode='lines+markers',
+                        name='Passes',
+                        line=dict(color='#B22222', width=3)
+                    ))
             
-            # Ajout de la courbe PPM (Points Per Match) s'il y a des données dispos
-            if 'PPM' in joueur_data.columns and not joueur_data['PPM'].isna().all():
-                 # Calculer la moyenne de PPM par saison pour ce joueur
-                 ppm_saison = joueur_data.groupby('Saison')['PPM'].mean().reset_index()
-                 fig_joueur.add_trace(go.Scatter(
-                    x=ppm_saison['Saison'],
-                    y=ppm_saison['PPM'],
-                    mode='lines+markers',
-                    name='PPM (Moy.)',
-                    line=dict(color='#1f77b4', width=2, dash='dot'),
-                    yaxis='y2'
-                ))
+                    # Ajout de la courbe PPM (Points Per Match) s'il y a des données dispos
+                    if ppm_saison is not None:
+                         fig_joueur.add_trace(go.Scatter(
+                            x=ppm_saison['Saison'],
+                            y=ppm_saison['PPM'],
+                            mode='lines+markers',
+                            name='PPM (Moy.)',
+                            line=dict(color='#1f77b4', width=2, dash='dot'),
+                            yaxis='y2'
+                        ))
             
-            fig_joueur.update_layout(
-                title="Évolution des Performances (Buts, Passes & PPM)",
-                height=400,
-                yaxis=dict(title="Buts / Passes"),
-                yaxis2=dict(
-                    title="PPM",
-                    overlaying="y",
-                    side="right",
-                    range=[0, 3]
-                ),
-                legend=dict(x=0, y=1.2, orientation="h")
-            )
-            st.plotly_chart(fig_joueur, use_container_width=True)
+                    fig_joueur.update_layout(
+                        title="Évolution des Performances (Buts, Passes & PPM)",
+                        height=400,
+                        yaxis=dict(title="Buts / Passes"),
+                        yaxis2=dict(
+                            title="PPM",
+                            overlaying="y",
+                            side="right",
+                            range=[0, 3]
+                        ),
+                        legend=dict(x=0, y=1.2, orientation="h")
+                    )
+                    return fig_joueur
+                afficher_graphique('evolution_joueur', figure_joueur, stats_saison, ppm_saison)
     
-    st.markdown("---")
+    section_profil()
     
-    # Comparaison de joueurs
-    st.markdown("### 🔀 Comparaison de Joueurs")
+    st.markdown("---")
     
-    col1, col2 = st.columns(2)
-    with col1:
-        joueur1 = st.selectbox("Joueur 1", sorted(df['Name'].unique()), key='j1')
-    with col2:
-        joueur2 = st.selectbox("Joueur 2", sorted(df['Name'].unique()), key='j2')
-    
-    if joueur1 and joueur2:
-        data_j1 = df[df['Name'] == joueur1].agg({
-            'Buts': 'sum',
-            'Passes décisives': 'sum',
-            'Matchs': 'sum',
-            'Minutes jouées': 'sum',
-            'Cartons Jaunes': 'sum'
-        })
+    @st.fragment
+    def section_comparaison():
+        # Comparaison de joueurs
+        st.markdown("### 🔀 Comparaison de Joueurs")
+        
+        # Sélection de plusieurs joueurs : résultats de la recherche + joueurs déjà choisis
+        requete = st.text_input("Ajouter des joueurs — recherche", key='comparaison_recherche',
+                                placeholder="Nom du joueur (ex. Elkaabi)")
+        choisis = st.session_state.get('comparaison', [])
+        # Après un rechargement des données, seuls les joueurs encore présents restent sélectionnés
+        if any(j not in joueurs_donnees.index for j in choisis):
+            choisis = [j for j in choisis if j in joueurs_donnees.index]
+            st.session_state['comparaison'] = choisis
+        options = list(dict.fromkeys(choisis + analytics.rechercher_joueurs(index_noms, requete)))
+        selection = st.multiselect(
+            f"Joueurs comparés (jusqu'à {analytics.MAX_JOUEURS_COMPARAISON})",
+            options,
+            format_func=nom_joueur,
+            max_selections=analytics.MAX_JOUEURS_COMPARAISON,
+            key='comparaison'
+        )
+        if not selection:
+            st.info("Ajoutez des joueurs pour les comparer.")
+            return
+        
+        # Saison comparée pour chaque joueur (par défaut la plus récente classable dans une cohorte)
+        colonnes = st.columns(min(len(selection), 5))
+        elements = []
+        for rang, identifiant in enumerate(selection):
+            debut, fin = carrieres_donnees['bornes'][identifiant]
+            saisons_joueur = carrieres_donnees['saisons']['Saison'].iloc[debut:fin].tolist()[::-1]
+            with colonnes[rang % len(colonnes)]:
+                saison = st.selectbox(nom_joueur(identifiant), saisons_joueur,
+                                      index=analytics.saison_par_defaut(df, cohortes_donnees, identifiant,
+                                                                        saisons_joueur),
+                                      key=f"comparaison_saison_{identifiant}")
+            elements.append((identifiant, saison))
+        
+        echelle = st.radio("Échelle", ["Centiles (joueurs du même poste)", "Valeurs par 90 minutes"],
+                           horizontal=True, key='comparaison_echelle')
+        comparaison = analytics.comparer_joueurs(df, cohortes_donnees, elements)
+        
+        def figure_radar(comparaison, echelle):
+            centiles = echelle.startswith("Centiles")
+            couleurs = ['#DC143C', '#4169E1', '#D4AF37', '#1A1A1A', '#2E8B57',
+                        '#8B0000', '#FF8C00', '#6A5ACD', '#20B2AA', '#A0522D']
+            categories = list(analytics.METRIQUES_COMPARAISON.values())
+            fig_radar = go.Figure()
+            for rang, ligne in enumerate(comparaison.to_dict('records')):
+                valeurs = [ligne[f"{m}_centile" if centiles else m] for m in analytics.METRIQUES_COMPARAISON]
+                fig_radar.add_trace(go.Scatterpolar(
+                    r=valeurs + valeurs[:1],
+                    theta=categories + categories[:1],
+                    fill='toself',
+                    opacity=0.6,
+                    name=f"{ligne['Name']} ({ligne['Saison']})",
+                    line_color=couleurs[rang % len(couleurs)]
+                ))
+            fig_radar.update_layout(
+                polar=dict(radialaxis=dict(visible=True, range=[0, 100] if centiles else None)),
+                showlegend=True,
+                height=550
+            )
+            return fig_radar
+        afficher_graphique('radar_comparaison', figure_radar, comparaison, echelle)
         
-        data_j2 = df[df['Name'] == joueur2].agg({
-            'Buts': 'sum',
-            'Passes décisives': 'sum',
-            'Matchs': 'sum',
-            'Minutes jouées': 'sum',
-            'Cartons Jaunes': 'sum'
+        st.caption(f"Centiles calculés parmi les joueurs du même poste sur la même saison "
+                   f"(au moins {analytics.MINUTES_MIN_COHORTE} minutes jouées). Avec moins de "
+                   f"{analytics.TAILLE_MIN_COHORTE} joueurs, la cohorte est élargie au même poste toutes "
+                   f"saisons, puis au groupe de postes : colonne « Référence ». Une saison de moins de "
+                   f"{analytics.MINUTES_MIN_COHORTE} minutes n'est pas classée (centiles vides).")
+        tableau = comparaison.drop(columns='ID_joueur').rename(columns={
+            **analytics.METRIQUES_COMPARAISON,
+            **{f"{m}_centile": f"{libelle} (centile)" for m, libelle in analytics.METRIQUES_COMPARAISON.items()}
         })
+        st.dataframe(tableau.round(2), hide_index=True, use_container_width=True)
+    
+    section_comparaison()
+    
+    st.markdown("---")
+    
+    @st.fragment
+    def section_similaires():
+        # Joueurs au profil statistique proche (plus proches voisins sur les vecteurs par 90 minutes)
+        st.markdown("### 🧭 Joueurs Similaires")
+        identifiant = choisir_joueur("Joueur de référence", key='similaires')
+        if identifiant is None:
+            return
         
-        # Radar chart
-        categories = ['Buts', 'Passes', 'Matchs', 'Minutes/100', 'Cartons']
-        
-        fig_radar = go.Figure()
-        
-        fig_radar.add_trace(go.Scatterpolar(
-            r=[data_j1['Buts'], data_j1['Passes décisives'], data_j1['Matchs'], 
-               data_j1['Minutes jouées']/100, data_j1['Cartons Jaunes']],
-            theta=categories,
-            fill='toself',
-            name=joueur1,
-            line_color='#DC143C'
-        ))
-        
-        fig_radar.add_trace(go.Scatterpolar(
-            r=[data_j2['Buts'], data_j2['Passes décisives'], data_j2['Matchs'], 
-               data_j2['Minutes jouées']/100, data_j2['Cartons Jaunes']],
-            theta=categories,
-            fill='toself',
-            name=joueur2,
-            line_color='#4169E1'
-        ))
-        
-        fig_radar.update_layout(
-            polar=dict(radialaxis=dict(visible=True)),
-            showlegend=True,
-            height=500
-        )
+        debut, fin = carrieres_donnees['bornes'][identifiant]
+        saisons_joueur = carrieres_donnees['saisons']['Saison'].iloc[debut:fin].tolist()[::-1]
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            saison = st.selectbox("Saison de référence", saisons_joueur, key='similaires_saison')
+            ligne = cohortes_donnees['lignes'].get((identifiant, str(saison)))
+        if ligne is None:
+            st.info("Aucune saison disponible pour ce joueur.")
+            return
+        with col2:
+            positions = ["Toutes"] + sorted(similarite_donnees['blocs'])
+            poste_joueur = str(df['Position'].iat[ligne])
+            poste = st.selectbox("Poste", positions,
+                                 index=positions.index(poste_joueur) if poste_joueur in positions else 0,
+                                 key=f"similaires_poste_{identifiant}_{saison}")
+        with col3:
+            age_min, age_max = int(df['Age'].min()), int(df['Age'].max())
+            ages = st.slider("Âge", age_min, age_max, (age_min, age_max), key='similaires_age') \
+                if age_max > age_min else (age_min, age_max)
         
-        st.plotly_chart(fig_radar, use_container_width=True)
+        # Une borne laissée à l'extrémité du curseur ne filtre pas : les âges inconnus restent inclus
+        similaires = analytics.joueurs_similaires(
+            df, similarite_donnees, ligne,
+            position=None if poste == "Toutes" else poste,
+            age_min=ages[0] if ages[0] > age_min else None,
+            age_max=ages[1] if ages[1] < age_max else None
+        )
+        if similaires.empty:
+            st.info("Aucun joueur ne correspond à ces filtres.")
+            return
+        st.caption(f"Profils les plus proches de {nom_joueur(identifiant)} ({saison}) parmi les saisons "
+                   f"d'au moins {analytics.MINUTES_MIN_COHORTE} minutes jouées : buts, passes et cartons par 90 minutes, "
+                   f"temps de jeu, PPM, âge et valeur marchande.")
+        st.dataframe(similaires.round(2), hide_index=True, use_container_width=True)
+    
+    section_similaires()
 
 # PAGE 4: VALEUR MARCHANDE
 elif page == "💰 Valeur Marchande":
@@ -685,70 +859,77 @@ elif page == "💰 Valeur Marchande":
     
     with col1:
         # Top 10 joueurs les plus chers
-        top_valeur = df_filtered.nlargest(10, 'market_value')[['Name', 'market_value', 'Position']]
-        
-        fig_valeur = px.bar(
-            top_valeur,
-            x='market_value',
-            y='Name',
-            orientation='h',
-            title="Top 10 Joueurs par Valeur Marchande",
-            color='market_value',
-            color_continuous_scale=['#FFB6C1', '#DC143C', '#8B0000'],
-            labels={'market_value': 'Valeur (€)'}
-        )
-        fig_valeur.update_layout(height=500)
-        st.plotly_chart(fig_valeur, use_container_width=True)
+        top_valeur = analytics.top_valeur(df_filtered, 10)
+        
+        def figure_valeur(top_valeur):
+            fig_valeur = px.bar(
+                top_valeur,
+                x='market_value',
+                y='Name',
+                orientation='h',
+                title="Top 10 Joueurs par Valeur Marchande",
+                color='market_value',
+                color_continuous_scale=['#FFB6C1', '#DC143C', '#8B0000'],
+                labels={'market_value': 'Valeur (€)'}
+            )
+            fig_valeur.update_layout(height=500)
+            return fig_valeur
+        afficher_graphique('top_valeur', figure_valeur, top_valeur)
     
     with col2:
         # Valeur par position
-        valeur_pos = df_filtered.groupby('Position')['market_value'].agg(['sum', 'mean', 'count']).reset_index()
-        
-        fig_val_pos = px.bar(
-            valeur_pos,
-            x='Position',
-            y='sum',
-            title="Valeur Totale par Position",
-            color='mean',
-            color_continuous_scale='Reds',
-            labels={'sum': 'Valeur Totale (€)', 'mean': 'Valeur Moyenne'}
-        )
-        fig_val_pos.update_layout(height=500, xaxis_tickangle=-45)
-        st.plotly_chart(fig_val_pos, use_container_width=True)
+        valeur_pos = analytics.valeur_par_position(cube_filtered)
+        
+        def figure_val_pos(valeur_pos):
+            fig_val_pos = px.bar(
+                valeur_pos,
+                x='Position',
+                y='sum',
+                title="Valeur Totale par Position",
+                color='mean',
+                color_continuous_scale='Reds',
+                labels={'sum': 'Valeur Totale (€)', 'mean': 'Valeur Moyenne'}
+            )
+            fig_val_pos.update_layout(height=500, xaxis_tickangle=-45)
+            return fig_val_pos
+        afficher_graphique('valeur_position', figure_val_pos, valeur_pos)
     
     # Évolution de la valeur
     st.markdown("### 📈 Évolution de la Valeur par Saison")
     
-    valeur_saison = df.groupby('Saison')['market_value'].agg(['sum', 'mean']).reset_index()
-    
-    fig_evol_val = make_subplots(specs=[[{"secondary_y": True}]])
+    valeur_saison = analytics.valeur_par_saison(cube_donnees)
     
-    fig_evol_val.add_trace(
-        go.Bar(name="Valeur Totale", x=valeur_saison['Saison'], y=valeur_saison['sum'], 
-               marker_color='#DC143C'),
-        secondary_y=False,
-    )
+    def figure_evol_val(valeur_saison):
+        fig_evol_val = make_subplots(specs=[[{"secondary_y": True}]])
     
-    fig_evol_val.add_trace(
-        go.Scatter(name="Valeur Moyenne", x=valeur_saison['Saison'], y=valeur_saison['mean'], 
-                   line=dict(color='#4169E1', width=3)),
-        secondary_y=True,
-    )
+        fig_evol_val.add_trace(
+            go.Bar(name="Valeur Totale", x=valeur_saison['Saison'], y=valeur_saison['sum'], 
+                   marker_color='#DC143C'),
+            secondary_y=False,
+        )
     
-    fig_evol_val.update_layout(height=400)
-    fig_evol_val.update_xaxes(title_text="Saison")
-    fig_evol_val.update_yaxes(title_text="Valeur Totale (€)", secondary_y=False)
-    fig_evol_val.update_yaxes(title_text="Valeur Moyenne (€)", secondary_y=True)
+        fig_evol_val.add_trace(
+            go.Scatter(name="Valeur Moyenne", x=valeur_saison['Saison'], y=valeur_saison['mean'], 
+                       line=dict(color='#4169E1', width=3)),
+            secondary_y=True,
+        )
     
-    st.plotly_chart(fig_evol_val, use_container_width=True)
+        fig_evol_val.update_layout(height=400)
+        fig_evol_val.update_xaxes(title_text="Saison")
+        fig_evol_val.update_yaxes(title_text="Valeur Totale (€)", secondary_y=False)
+        fig_evol_val.update_yaxes(title_text="Valeur Moyenne (€)", secondary_y=True)
+        return fig_evol_val
+    afficher_graphique('evolution_valeur', figure_evol_val, valeur_saison)
 
 # PAGE 5: ANALYSES AVANCÉES
 elif page == "📊 Analyses Avancées":
     st.markdown("## 📊 Analyses Statistiques Avancées")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["🎯 Efficacité", "📊 Corrélations", "🏆 Records", "🦁 Fidélité & Longévité"])
+    tab1, tab2, tab3, tab4 = onglets(["🎯 Efficacité", "📊 Corrélations", "🏆 Records", "🦁 Fidélité & Longévité"],
+                                     key="onglets_analyses")
     
-    with tab4:
+    @st.fragment
+    def onglet_fidelite(cube_filtered):
         st.markdown("### 🦁 Fidélité & Longévité du Vestiaire")
         
         col1, col2 = st.columns([1, 1])
@@ -756,112 +937,128 @@ elif page == "📊 Analyses Avancées":
         with col1:
             # Joueurs avec le plus de saisons
             st.markdown("#### 📅 Joueurs les plus Fidèles")
-            nb_saisons = df_filtered.groupby('Name')['Saison'].nunique().sort_values(ascending=False).reset_index()
-            nb_saisons.columns = ['Joueur', 'Nombre de Saisons']
+            nb_saisons = analytics.nombre_saisons(cube_filtered)
             
-            fig_saisons = px.bar(
-                nb_saisons.head(15),
-                x='Nombre de Saisons',
-                y='Joueur',
-                orientation='h',
-                title="Top 15: Nombre de Saisons Disputées",
-                color='Nombre de Saisons',
-                color_continuous_scale=['#FFB6C1', '#DC143C', '#8B0000']
-            )
-            fig_saisons.update_layout(height=500, yaxis={'categoryorder':'total ascending'})
-            st.plotly_chart(fig_saisons, use_container_width=True)
+            def figure_saisons(nb_saisons):
+                fig_saisons = px.bar(
+                    nb_saisons.head(15),
+                    x='Nombre de Saisons',
+                    y='Joueur',
+                    orientation='h',
+                    title="Top 15: Nombre de Saisons Disputées",
+                    color='Nombre de Saisons',
+                    color_continuous_scale=['#FFB6C1', '#DC143C', '#8B0000']
+                )
+                fig_saisons.update_layout(height=500, yaxis={'categoryorder':'total ascending'})
+                return fig_saisons
+            afficher_graphique('fidelite_saisons', figure_saisons, nb_saisons)
 
         with col2:
              # Heatmap de présence
             st.markdown("#### 🗓️ Présence par Saison (Top 20 Joueurs)")
             
-            # On prend les 20 joueurs ayant le plus de matchs au total
-            top_joueurs_matchs = df_filtered.groupby('Name')['Matchs'].sum().nlargest(20).index.tolist()
-            presences = df_filtered[df_filtered['Name'].isin(top_joueurs_matchs)].pivot_table(
-                index='Name', 
-                columns='Saison', 
-                values='Matchs', 
-                aggfunc='sum'
-            ).fillna(0)
+            # On garde les 20 joueurs ayant le plus de matchs au total, les autres sont moyennés
+            presences = analytics.presences_saisons(cube_filtered, 20)
             
-            fig_heatmap = px.imshow(
-                presences,
-                labels=dict(x="Saison", y="Joueur", color="Matchs Joués"),
-                x=presences.columns,
-                y=presences.index,
-                color_continuous_scale='Reds',
-                aspect="auto"
-            )
-            fig_heatmap.update_layout(height=500, title="Matchs joués par saison")
-            st.plotly_chart(fig_heatmap, use_container_width=True)
+            def figure_heatmap(presences):
+                fig_heatmap = px.imshow(
+                    presences,
+                    labels=dict(x="Saison", y="Joueur", color="Matchs Joués"),
+                    x=presences.columns,
+                    y=presences.index,
+                    color_continuous_scale='Reds',
+                    aspect="auto"
+                )
+                fig_heatmap.update_layout(height=500, title="Matchs joués par saison")
+                return fig_heatmap
+            afficher_graphique('presences_saisons', figure_heatmap, presences)
 
         st.markdown("---")
         st.markdown("### 🔄 Stabilité de l'Effectif")
         
-        # Calcul de la rétention d'une année sur l'autre
-        saisons_list = sorted(df['Saison'].unique())
-        retention_data = []
+        # Rétention calculée une fois par version des données (toutes les paires de saisons)
+        retention = jeu.retention
+        df_retention = retention['transitions']
         
-        for i in range(len(saisons_list) - 1):
-            s1 = saisons_list[i]
-            s2 = saisons_list[i+1]
-            joueurs_s1 = set(df[df['Saison'] == s1]['Name'])
-            joueurs_s2 = set(df[df['Saison'] == s2]['Name'])
-            
-            communs = joueurs_s1.intersection(joueurs_s2)
-            taux = len(communs) / len(joueurs_s1) * 100 if len(joueurs_s1) > 0 else 0
-            
-            retention_data.append({
-                'Saison': f"{s1} → {s2}",
-                'Taux de Rétention (%)': taux,
-                'Joueurs Conservés': len(communs),
-                'Effectif Saison N': len(joueurs_s1)
-            })
-            
-        df_retention = pd.DataFrame(retention_data)
-        
-        fig_retention = px.line(
-            df_retention, 
-            x='Saison', 
-            y='Taux de Rétention (%)',
-            markers=True,
-            title="Taux de Rétention de l'Effectif (Saison N par rapport à N+1)",
-            line_shape='spline'
-        )
-        fig_retention.update_traces(line_color='#DC143C', line_width=4)
-        fig_retention.update_layout(height=400, yaxis_range=[0, 100])
-        st.plotly_chart(fig_retention, use_container_width=True)
+        def figure_retention(df_retention):
+            fig_retention = px.line(
+                df_retention, 
+                x='Saison', 
+                y='Taux de Rétention (%)',
+                markers=True,
+                title="Taux de Rétention de l'Effectif (Saison N par rapport à N+1)",
+                line_shape='spline'
+            )
+            fig_retention.update_traces(line_color='#DC143C', line_width=4)
+            fig_retention.update_layout(height=400, yaxis_range=[0, 100])
+            return fig_retention
+        afficher_graphique('taux_retention', figure_retention, df_retention)
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            # Mouvements d'effectif entre deux saisons consécutives
+            def figure_mouvements(df_retention):
+                fig_mouvements = go.Figure()
+                for mouvement, couleur in [('Arrivées', '#DC143C'), ('Départs', '#1A1A1A'), ('Retours', '#D4AF37')]:
+                    fig_mouvements.add_trace(go.Bar(
+                        name=mouvement,
+                        x=df_retention['Saison'],
+                        y=df_retention[mouvement],
+                        marker_color=couleur
+                    ))
+                fig_mouvements.update_layout(
+                    title="Arrivées, Départs et Retours",
+                    barmode='group',
+                    height=450,
+                    xaxis_tickangle=-45
+                )
+                return fig_mouvements
+            afficher_graphique('mouvements_effectif', figure_mouvements, df_retention)
+        
+        with col2:
+            # Rétention de la saison N vers chaque saison ultérieure N+k
+            def figure_matrice(matrice_retention):
+                fig_matrice = px.imshow(
+                    matrice_retention,
+                    labels=dict(x="Saison N+k", y="Saison N", color="Rétention (%)"),
+                    color_continuous_scale='Reds',
+                    zmin=0,
+                    zmax=100,
+                    aspect="auto"
+                )
+                fig_matrice.update_layout(height=450, title="Rétention N → N+k (%)")
+                return fig_matrice
+            afficher_graphique('matrice_retention', figure_matrice, retention['matrice'])
 
 
-    with tab1:
+    @st.fragment
+    def onglet_efficacite(cube_filtered):
         st.markdown("### 🎯 Efficacité des Joueurs")
         
         # Calculer les métriques d'efficacité
-        efficacite = df_filtered.groupby('Name').agg({
-            'Buts': 'sum',
-            'Matchs': 'sum',
-            'Minutes jouées': 'sum',
-            'Passes décisives': 'sum',
-            'Position': 'first'
-        }).reset_index()
-        
-        efficacite['Buts_par_match'] = efficacite['Buts'] / efficacite['Matchs']
-        efficacite['Minutes_par_but'] = efficacite['Minutes jouées'] / efficacite['Buts'].replace(0, np.nan)
-        efficacite['Contributions_par_match'] = (efficacite['Buts'] + efficacite['Passes décisives']) / efficacite['Matchs']
+        efficacite = analytics.calculer_efficacite(cube_filtered)
         
         # Scatter plot
-        fig_efficacite = px.scatter(
-            efficacite[efficacite['Matchs'] >= 5],
-            x='Minutes jouées',
-            y='Contributions_par_match',
-            size='Buts',
-            color='Position',
-            hover_data=['Name'],
-            title="Efficacité: Contributions vs Temps de Jeu (Min 5 matchs)",
-            color_discrete_sequence=px.colors.qualitative.Set1
-        )
-        fig_efficacite.update_layout(height=500)
-        st.plotly_chart(fig_efficacite, use_container_width=True)
+        def figure_efficacite(efficacite):
+            # Au-delà du budget de points, le nuage est agrégé sur une grille côté serveur
+            points, agrege = analytics.reduire_nuage(efficacite[efficacite['Matchs'] >= 5],
+                                           'Minutes jouées', 'Contributions_par_match', 'Position', 'Buts')
+            titre = "Efficacité: Contributions vs Temps de Jeu (Min 5 matchs)"
+            fig_efficacite = px.scatter(
+                points,
+                x='Minutes jouées',
+                y='Contributions_par_match',
+                size='Buts',
+                color='Position',
+                hover_data=['Name'],
+                title=titre + (" — points agrégés" if agrege else ""),
+                color_discrete_sequence=px.colors.qualitative.Set1,
+                render_mode=mode_rendu(len(points))
+            )
+            fig_efficacite.update_layout(height=500)
+            return fig_efficacite
+        afficher_graphique('efficacite', figure_efficacite, efficacite)
         
         # Top efficacité
         col1, col2 = st.columns(2)
@@ -880,27 +1077,33 @@ elif page == "📊 Analyses Avancées":
             ]
             st.dataframe(top_min_but.round(0), hide_index=True, use_container_width=True)
     
-    with tab2:
+    @st.fragment
+    def onglet_correlations(df_filtered, saison_selectionnee, position_selectionnee):
         st.markdown("### 📊 Analyse des Corrélations")
         
-        # Matrice de corrélation
-        numeric_cols = ['Age', 'Matchs', 'Buts', 'Passes décisives', 'Minutes jouées', 
-                       'Cartons Jaunes', 'PPM', 'market_value']
-        
-        # Vérifier que les colonnes existent
-        available_cols = [col for col in numeric_cols if col in df_filtered.columns]
+        methode = st.radio("Méthode", ["Pearson", "Spearman (rangs)"], horizontal=True,
+                           key='methode_correlation')
         
-        corr_matrix = df_filtered[available_cols].corr()
+        # Matrice de corrélation : Pearson assemblée depuis les statistiques par cellule
+        # Saison × Position, Spearman mémoïsée par filtre
+        if methode == "Pearson":
+            corr_matrix = correlation_pearson(stats_correlation, rapport_chargement['version'],
+                                              saison_selectionnee, position_selectionnee)
+        else:
+            corr_matrix = correlation_spearman(df_filtered, rapport_chargement['version'],
+                                               saison_selectionnee, position_selectionnee)
         
-        fig_corr = px.imshow(
-            corr_matrix,
-            text_auto='.2f',
-            aspect="auto",
-            title="Matrice de Corrélation",
-            color_continuous_scale='RdYlBu_r'
-        )
-        fig_corr.update_layout(height=600)
-        st.plotly_chart(fig_corr, use_container_width=True)
+        def figure_corr(corr_matrix, methode):
+            fig_corr = px.imshow(
+                corr_matrix,
+                text_auto='.2f',
+                aspect="auto",
+                title=f"Matrice de Corrélation ({methode})",
+                color_continuous_scale='RdYlBu_r'
+            )
+            fig_corr.update_layout(height=600)
+            return fig_corr
+        afficher_graphique('correlations', figure_corr, corr_matrix, methode)
         
         # Insights
         st.markdown("#### 💡 Insights Clés")
@@ -921,7 +1124,8 @@ elif page == "📊 Analyses Avancées":
                 corr_buts_valeur = corr_matrix.loc['Buts', 'market_value']
                 st.metric("Corrélation Buts - Valeur", f"{corr_buts_valeur:.2f}")
     
-    with tab3:
+    @st.fragment
+    def onglet_records():
         st.markdown("### 🏆 Records et Statistiques Remarquables")
         
         col1, col2 = st.columns(2)
@@ -929,12 +1133,18 @@ elif page == "📊 Analyses Avancées":
         with col1:
             st.markdown("#### 🌟 Records Individuels")
             
+            records_saison = records_donnees['saison']
+            buts, buts_noms = analytics.detenteurs(records_saison['Buts'], 'Buts', avec_saison=True)
+            passes, passes_noms = analytics.detenteurs(records_saison['Passes décisives'], 'Passes décisives', avec_saison=True)
+            minutes, minutes_noms = analytics.detenteurs(records_saison['Minutes jouées'], 'Minutes jouées', avec_saison=True)
+            jaunes, jaunes_noms = analytics.detenteurs(records_saison['Cartons Jaunes'], 'Cartons Jaunes', avec_saison=True)
+            valeur, valeur_noms = analytics.detenteurs(records_saison['market_value'], 'market_value', avec_saison=True)
             records = {
-                "🥇 Plus de buts en une saison": int(df.groupby(['Name', 'Saison'])['Buts'].sum().max()),
-                "🎯 Plus de passes en une saison": int(df.groupby(['Name', 'Saison'])['Passes décisives'].sum().max()),
-                "⏱️ Plus de minutes en une saison": int(df.groupby(['Name', 'Saison'])['Minutes jouées'].sum().max()),
-                "🟨 Plus de cartons jaunes": int(df['Cartons Jaunes'].max()),
-                "💰 Valeur la plus élevée": f"{df['market_value'].max()/1000:.0f}K€"
+                "🥇 Plus de buts en une saison": f"{int(buts)} — {buts_noms}",
+                "🎯 Plus de passes en une saison": f"{int(passes)} — {passes_noms}",
+                "⏱️ Plus de minutes en une saison": f"{int(minutes)} — {minutes_noms}",
+                "🟨 Plus de cartons jaunes": f"{int(jaunes)} — {jaunes_noms}",
+                "💰 Valeur la plus élevée": f"{valeur/1000:.0f}K€ — {valeur_noms}"
             }
             
             for record, valeur in records.items():
@@ -943,12 +1153,13 @@ elif page == "📊 Analyses Avancées":
         with col2:
             st.markdown("#### 📈 Statistiques d'Équipe")
             
+            equipe = records_donnees['equipe']
             stats_equipe = {
-                "👥 Total de joueurs différents": df['Name'].nunique(),
-                "⚽ Total de buts marqués": int(df['Buts'].sum()),
-                "🎯 Total de passes décisives": int(df['Passes décisives'].sum()),
-                "⏱️ Total de minutes jouées": f"{int(df['Minutes jouées'].sum()/60000)}K heures",
-                "🎂 Âge moyen": f"{df['Age'].mean():.1f} ans"
+                "👥 Total de joueurs différents": equipe['joueurs'],
+                "⚽ Total de buts marqués": equipe['buts'],
+                "🎯 Total de passes décisives": equipe['passes'],
+                "⏱️ Total de minutes jouées": f"{int(equipe['minutes']/60000)}K heures",
+                "🎂 Âge moyen": f"{equipe['age_moyen']:.1f} ans"
             }
             
             for stat, valeur in stats_equipe.items():
@@ -957,25 +1168,51 @@ elif page == "📊 Analyses Avancées":
         # Meilleurs par catégorie
         st.markdown("#### 🏅 Hall of Fame")
         
+        records_carriere = records_donnees['carriere']
         col1, col2, col3 = st.columns(3)
         
         with col1:
             st.markdown("**🥇 Top Buteur All-Time**")
-            top_buteur = df.groupby('Name')['Buts'].sum().idxmax()
-            buts_total = df.groupby('Name')['Buts'].sum().max()
+            buts_total, top_buteur = analytics.detenteurs(records_carriere['Buts'], 'Buts')
             st.success(f"{top_buteur}\n\n{int(buts_total)} buts")
         
         with col2:
             st.markdown("**🎯 Top Passeur All-Time**")
-            top_passeur = df.groupby('Name')['Passes décisives'].sum().idxmax()
-            passes_total = df.groupby('Name')['Passes décisives'].sum().max()
+            passes_total, top_passeur = analytics.detenteurs(records_carriere['Passes décisives'], 'Passes décisives')
             st.success(f"{top_passeur}\n\n{int(passes_total)} passes")
         
         with col3:
             st.markdown("**⏱️ Plus de Temps de Jeu**")
-            top_minutes = df.groupby('Name')['Minutes jouées'].sum().idxmax()
-            minutes_total = df.groupby('Name')['Minutes jouées'].sum().max()
+            minutes_total, top_minutes = analytics.detenteurs(records_carriere['Minutes jouées'], 'Minutes jouées')
             st.success(f"{top_minutes}\n\n{int(minutes_total)} minutes")
+        
+        # Classements complets
+        st.markdown(f"#### 📋 Classements (Top {analytics.RECORDS_TOP_K}, ex æquo inclus)")
+        metrique = st.selectbox(
+            "Métrique",
+            list(analytics.METRIQUES_RECORDS),
+            format_func=analytics.METRIQUES_RECORDS.get,
+            key='metrique_records'
+        )
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("**Sur une saison**")
+            st.dataframe(records_saison[metrique], hide_index=True, use_container_width=True)
+        
+        with col2:
+            st.markdown("**Sur la carrière**")
+            st.dataframe(records_carriere[metrique], hide_index=True, use_container_width=True)
+
+
+    # Seul l'onglet affiché est calculé
+    rendre_onglet(tab1, onglet_efficacite, cube_filtered)
+    rendre_onglet(tab2, onglet_correlations, df_filtered, saison_selectionnee, position_selectionnee)
+    rendre_onglet(tab3, onglet_records)
+    rendre_onglet(tab4, onglet_fidelite, cube_filtered)
+
+instrumentation.terminer(span_page)
 
 # Footer
 st.markdown("---")
@@ -985,4 +1222,30 @@ st.markdown("""
         <p>🔴⚪ DiMa Wydad - Fondé en 1937</p>
         <p>Créé avec ❤️</p>
     </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+# Mesures du rerun : panneau d'administration dans la barre latérale
+rerun = instrumentation.fin_rerun()
+if rerun is not None:
+    with panneau_instrumentation.container():
+        with st.expander(f"🩺 Instrumentation · rerun {rerun.duree * 1000:.0f} ms"):
+            st.markdown("**Spans du rerun**")
+            spans = pd.DataFrame(rerun.spans, columns=['span', 'niveau', 'debut_ms', 'duree_ms'])
+            spans['span'] = ['· ' * niveau + nom for nom, niveau in zip(spans['span'], spans['niveau'])]
+            st.dataframe(spans.drop(columns='niveau').round(2), hide_index=True, use_container_width=True)
+            
+            totaux = instrumentation.registre.instantane()
+            st.markdown(f"**Caches** ({totaux['reruns']} reruns)")
+            st.dataframe(pd.DataFrame.from_dict(totaux['caches'], orient='index').rename_axis('cache'),
+                         use_container_width=True)
+            durees = {nom: stats for nom, stats in totaux['durees'].items()
+                      if nom in ('rafraichissement', 'donnees') or nom.startswith('preparation')}
+            st.markdown(f"**Rechargements des données** ({totaux['rafraichissements'].get('succes', 0)} réussis, "
+                        f"{totaux['rafraichissements'].get('echec', 0)} échoués)")
+            st.dataframe(pd.DataFrame.from_dict(durees, orient='index', columns=['nombre', 'total_s', 'max_s'])
+                         .rename_axis('span').round(3), use_container_width=True)
+            st.markdown("**Octets envoyés par graphique (ce rerun)**")
+            st.dataframe(pd.Series(rerun.octets, name='octets', dtype='int64').rename_axis('graphique'),
+                         use_container_width=True)
+            st.download_button("Exporter (Prometheus)", instrumentation.prometheus(),
+                               file_name="wydad_metrics.prom", mime="text/plain")
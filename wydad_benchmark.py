@@ -0,0 +1,345 @@
+"""Benchmarks du chargement et des calculs de chaque page du dashboard
+
+Génère des fichiers de saison synthétiques au schéma Merged_WYDAD_* à l'échelle voulue
+(saisons × joueurs × clubs), puis mesure le chargement à froid, le chargement depuis le
+snapshot, l'application des filtres et les calculs derrière chaque page et onglet de
+wydad_app.py (temps et pic mémoire). Aucune dépendance à Streamlit :
+
+    python wydad_benchmark.py --echelle 14x35x1 --echelle 14x35x50 --json bench.json
+    python wydad_benchmark.py --echelle 14x35x50 --reference bench.json
+
+Avec --reference, les mesures plus lentes que la référence au-delà du seuil sont
+signalées et le code de sortie vaut 1.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import wydad_analytics as analytics
+
+# Première saison des fichiers générés (Merged_WYDAD_201112.csv)
+PREMIERE_SAISON = 2011
+# Échelle par défaut : l'archive actuelle (14 saisons, ~35 joueurs, un club)
+ECHELLE_DEFAUT = '14x35x1'
+# Ralentissement toléré par rapport à la référence avant de signaler une régression
+SEUIL_REGRESSION = 0.20
+
+PRENOMS = ['Ayoub', 'Yahya', 'Walid', 'Nadir', 'Mourad', 'Youssef', 'Hicham', 'Badr', 'Achraf',
+           'Reda', 'Mehdi', 'Zakaria', 'Ismail', 'Anas', 'Omar', 'Hamza', 'Karim', 'Soufiane']
+NOMS = ['El Kaabi', 'Jabrane', 'El Karti', 'Lamyaghri', 'Lemsen', 'Rabeh', 'Amrani', 'Benabid',
+        'El Motie', 'Attiyat Allah', 'Dari', 'Noussir', 'Haddad', 'Jabri', 'Aouk', 'Nahiri']
+POSITIONS = ['Gardien de but', 'Défenseur central', 'Arrière gauche', 'Arrière droit',
+             'Milieu défensif', 'Milieu central', 'Milieu offensif', 'Ailier gauche',
+             'Ailier droit', 'Avant-centre']
+# Part de l'effectif conservée d'une saison à la suivante
+TAUX_RETENTION = 0.6
+
+
+def parser_echelle(texte):
+    """'14x35x50' -> (saisons, joueurs par club, clubs)"""
+    try:
+        saisons, joueurs, clubs = (int(valeur) for valeur in texte.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"échelle invalide: {texte} (attendu SAISONSxJOUEURSxCLUBS)")
+    if min(saisons, joueurs, clubs) < 1 or saisons > 99:
+        raise argparse.ArgumentTypeError(f"échelle invalide: {texte}")
+    return saisons, joueurs, clubs
+
+
+def nom_joueur(numero):
+    """Nom synthétique unique, construit à partir de prénoms et noms réels"""
+    prenom = PRENOMS[numero % len(PRENOMS)]
+    nom = NOMS[(numero // len(PRENOMS)) % len(NOMS)]
+    rang = numero // (len(PRENOMS) * len(NOMS))
+    return f"{prenom} {nom}" if rang == 0 else f"{prenom} {nom} {rang + 1}"
+
+
+def generer_donnees(dossier, saisons, joueurs, clubs, graine=0):
+    """Écrit `saisons` fichiers Merged_WYDAD_*.csv de joueurs × clubs lignes chacun
+
+    Les valeurs sont au format des exports réels (virgule décimale, '1,85m', '-') et une
+    partie de l'effectif est conservée d'une saison à l'autre. Renvoie le nombre de lignes.
+    """
+    rng = np.random.default_rng(graine)
+    effectif = joueurs * clubs
+    # Chaque saison : une part de l'effectif précédent, complétée par de nouveaux joueurs
+    numeros = np.arange(effectif)
+    prochain = effectif
+    age_initial = rng.integers(18, 34, size=effectif)
+    ages = dict(zip(numeros, age_initial))
+    postes = dict(zip(numeros, rng.integers(0, len(POSITIONS), size=effectif)))
+    # Taille fixe par joueur : l'attribution des identifiants la compare d'une saison à l'autre
+    tailles = dict(zip(numeros, rng.uniform(1.68, 1.95, size=effectif)))
+    total = 0
+    for i in range(saisons):
+        annee = PREMIERE_SAISON + i
+        saison = f"{annee}/{(annee + 1) % 100:02d}"
+        if i > 0:
+            conserves = rng.choice(numeros, size=int(effectif * TAUX_RETENTION), replace=False)
+            nouveaux = np.arange(prochain, prochain + effectif - len(conserves))
+            prochain += len(nouveaux)
+            for numero, age, poste, taille in zip(nouveaux, rng.integers(18, 34, size=len(nouveaux)),
+                                                  rng.integers(0, len(POSITIONS), size=len(nouveaux)),
+                                                  rng.uniform(1.68, 1.95, size=len(nouveaux))):
+                ages[numero] = age - i
+                postes[numero] = poste
+                tailles[numero] = taille
+            numeros = np.concatenate([conserves, nouveaux])
+
+        matchs = rng.integers(0, 35, size=effectif)
+        minutes = (matchs * rng.uniform(20, 90, size=effectif)).astype(int)
+        attaque = np.array([POSITIONS[postes[n]] in ('Avant-centre', 'Ailier gauche', 'Ailier droit')
+                            for n in numeros])
+        buts = rng.poisson(np.where(attaque, 0.35, 0.05) * matchs)
+        df = pd.DataFrame({
+            'Name': [nom_joueur(n) for n in numeros],
+            'Taille': [f"{tailles[n]:.2f}m".replace('.', ',') for n in numeros],
+            'Pied': rng.choice(['droit', 'gauche', ''], size=effectif),
+            'market_value': rng.choice([0.0, 150000.0, 300000.0, 600000.0, 1300000.0], size=effectif),
+            'Position': [POSITIONS[postes[n]] for n in numeros],
+            'Age': [ages[n] + i for n in numeros],
+            "Dans l'effectif": matchs + rng.integers(0, 5, size=effectif),
+            'Matchs': matchs.astype(float),
+            'Buts': buts.astype(float),
+            'Passes décisives': rng.poisson(0.1 * matchs).astype(float),
+            'Cartons Jaunes': rng.poisson(0.12 * matchs).astype(float),
+            'Cartons rouges/jaunes': rng.poisson(0.01 * matchs).astype(float),
+            'CartonS rouges': rng.poisson(0.01 * matchs).astype(float),
+            'Entré en jeu': rng.integers(0, 5, size=effectif).astype(float),
+            'Remplacé': rng.integers(0, 5, size=effectif).astype(float),
+            'PPM': [f"{p:.2f}".replace('.', ',') for p in rng.uniform(0.8, 2.5, size=effectif)],
+            'Minutes jouées': minutes,
+            'Saison': saison,
+        })
+        # Marqueurs de valeur manquante des exports
+        df.loc[rng.random(effectif) < 0.05, 'Taille'] = '-'
+        df.to_csv(os.path.join(dossier, f"Merged_WYDAD_{annee}{(annee + 1) % 100:02d}.csv"),
+                  index=False, encoding='utf-8')
+        total += len(df)
+    return total
+
+
+def mesurer(fonction, repetitions, preparation=None):
+    """Temps (min et médiane, en secondes) et pic mémoire Python (octets) de fonction()
+
+    preparation() est appelée avant chaque exécution, hors mesure. Le pic mémoire est
+    mesuré sur une exécution supplémentaire sous tracemalloc, exclue des temps.
+    """
+    durees = []
+    for _ in range(repetitions):
+        if preparation is not None:
+            preparation()
+        debut = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - debut)
+    if preparation is not None:
+        preparation()
+    tracemalloc.start()
+    try:
+        fonction()
+        _, pic = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'min': min(durees), 'mediane': statistics.median(durees), 'pic_memoire': pic}
+
+
+def scenarios_pages(df, index, cube, saison, position):
+    """Calculs derrière chaque page et onglet du dashboard, pour un filtre donné
+
+    Reproduit les appels de wydad_app.py, sans le cache Streamlit ni la construction
+    des figures. Renvoie {nom: fonction}.
+    """
+    df_f = analytics.filtrer_donnees(df, index, saison, position)
+    cube_f = analytics.filtrer_cube(cube, saison, position)
+    avec_saison = saison == 'Toutes'
+    joueur = df['ID_joueur'].value_counts().index[0]
+    stats_correlation = analytics.construire_stats_correlation(df, index)
+    index_noms = analytics.construire_index_noms(df)
+    carrieres = analytics.calculer_carrieres(df, analytics.table_joueurs(df))
+    cohortes = analytics.construire_cohortes(df, index)
+    # Comparaison : joueurs les plus présents, chacun sur sa saison la plus récente
+    compares = df['ID_joueur'].value_counts().index[:analytics.MAX_JOUEURS_COMPARAISON]
+    elements = [(identifiant, df['Saison'].iat[index['ID_joueur'][identifiant][-1]]) for identifiant in compares]
+    similarite = analytics.construire_index_similarite(df, cohortes)
+    reference = index['ID_joueur'][joueur][-1]
+
+    def profil_joueur():
+        analytics.carriere_joueur(carrieres, joueur)
+
+    def recherche():
+        for requete in ['', 'a', 'elka', 'Elkaabi', 'jabrne']:
+            analytics.rechercher_joueurs(index_noms, requete)
+
+    def comparaison():
+        analytics.comparer_joueurs(df, cohortes, elements)
+
+    def similaires():
+        analytics.joueurs_similaires(df, similarite, reference)
+        analytics.joueurs_similaires(df, similarite, reference, position=str(df['Position'].iat[reference]),
+                                     age_min=20, age_max=30)
+
+    def valeur_marchande():
+        df_f['market_value'].sum(), df_f['market_value'].mean(), df_f['market_value'].idxmax()
+        analytics.top_valeur(df_f, 10)
+        analytics.valeur_par_position(cube_f)
+        analytics.valeur_par_saison(cube)
+
+    def efficacite():
+        eff = analytics.calculer_efficacite(cube_f)
+        analytics.reduire_nuage(eff[eff['Matchs'] >= 5], 'Minutes jouées', 'Contributions_par_match',
+                                'Position', 'Buts')
+        eff[eff['Matchs'] >= 5].nlargest(10, 'Buts_par_match')
+        eff[eff['Buts'] > 0].nsmallest(10, 'Minutes_par_but')
+
+    def fidelite():
+        analytics.nombre_saisons(cube_f)
+        analytics.presences_saisons(cube_f, 20)
+        analytics.calculer_retention(df)
+
+    return {
+        'page.tableau_de_bord': lambda: (
+            df_f['ID_joueur'].nunique(), df_f['Buts'].sum(),
+            analytics.repartition_positions(df_f), analytics.evolution_saisons(cube)),
+        'page.performances.attaque': lambda: (
+            analytics.top_buteurs(cube_f, 10), analytics.top_contributions(df_f, 5)),
+        'page.performances.defense': lambda: (
+            analytics.cartons_par_position(cube_f), analytics.top_sanctionnes(df_f, 10, avec_saison)),
+        'page.performances.temps_de_jeu': lambda: (
+            analytics.minutes_par_position(cube_f), analytics.top_temps_de_jeu(df_f, 10, avec_saison)),
+        'page.joueurs.recherche': recherche,
+        'page.joueurs.profil': profil_joueur,
+        'page.joueurs.comparaison': comparaison,
+        'page.joueurs.similaires': similaires,
+        'page.valeur_marchande': valeur_marchande,
+        'page.analyses.efficacite': efficacite,
+        'page.analyses.correlations.pearson': lambda: analytics.correlation_pearson(stats_correlation, saison, position),
+        'page.analyses.correlations.spearman': lambda: analytics.correlation_spearman(df_f),
+        'page.analyses.records': lambda: analytics.calculer_records(df, cube),
+        'page.analyses.fidelite': fidelite,
+    }
+
+
+def executer(saisons, joueurs, clubs, repetitions=5, saison='Toutes', position='Toutes', graine=0):
+    """Génère le jeu de données d'une échelle et mesure chaque étape ; renvoie {nom: mesure}"""
+    dossier = tempfile.mkdtemp(prefix='wydad_bench_')
+    try:
+        lignes = generer_donnees(dossier, saisons, joueurs, clubs, graine)
+        cache = os.path.join(dossier, '.cache')
+        mesures = {}
+
+        def repartir_a_froid():
+            # Ni snapshot ni table des identifiants : chaque répétition refait toute l'ingestion
+            shutil.rmtree(cache, ignore_errors=True)
+            identites = os.path.join(dossier, analytics.IDENTITES_FICHIER)
+            if os.path.exists(identites):
+                os.remove(identites)
+
+        mesures['chargement.froid'] = mesurer(lambda: analytics.charger(dossier), repetitions, repartir_a_froid)
+        df, rapport = analytics.charger(dossier)
+        if 'erreur' in rapport:
+            raise RuntimeError(f"chargement des données synthétiques: {rapport['erreur']}")
+        if analytics.pa is not None:
+            mesures['chargement.snapshot'] = mesurer(lambda: analytics.charger(dossier), repetitions)
+
+        # Structures dérivées, construites une fois par version du jeu de données dans l'application
+        mesures['preparation.index'] = mesurer(lambda: analytics.construire_index(df), repetitions)
+        mesures['preparation.cube'] = mesurer(lambda: analytics.construire_cube(df), repetitions)
+        index = analytics.construire_index(df)
+        cube = analytics.construire_cube(df)
+        mesures['preparation.stats_correlation'] = mesurer(
+            lambda: analytics.construire_stats_correlation(df, index), repetitions)
+        mesures['preparation.cohortes'] = mesurer(lambda: analytics.construire_cohortes(df, index), repetitions)
+        cohortes = analytics.construire_cohortes(df, index)
+        mesures['preparation.similarite'] = mesurer(
+            lambda: analytics.construire_index_similarite(df, cohortes), repetitions)
+        mesures['preparation.carrieres'] = mesurer(
+            lambda: analytics.calculer_carrieres(df, analytics.table_joueurs(df)), repetitions)
+
+        # Tous les filtres proposés dans la barre latérale
+        filtres = [(s, p) for s in ['Toutes'] + sorted(df['Saison'].unique().tolist())
+                   for p in ['Toutes'] + sorted(df['Position'].unique().tolist())]
+        mesures['filtres'] = mesurer(lambda: [
+            (analytics.filtrer_donnees(df, index, s, p), analytics.filtrer_cube(cube, s, p)) for s, p in filtres
+        ], repetitions)
+
+        for nom, fonction in scenarios_pages(df, index, cube, saison, position).items():
+            mesures[nom] = mesurer(fonction, repetitions)
+        return {'lignes': lignes, 'lignes_chargees': len(df), 'mesures': mesures}
+    finally:
+        shutil.rmtree(dossier, ignore_errors=True)
+
+
+def formater_rapport(resultats, reference=None, seuil=SEUIL_REGRESSION):
+    """Rapport texte des mesures par échelle ; renvoie (texte, regressions)"""
+    lignes = []
+    regressions = []
+    for echelle, resultat in resultats.items():
+        lignes.append(f"\n== {echelle} : {resultat['lignes']} lignes générées, "
+                      f"{resultat['lignes_chargees']} chargées ==")
+        lignes.append(f"{'mesure':<38} {'min (ms)':>10} {'médiane (ms)':>13} {'pic (Mo)':>9} {'vs réf.':>8}")
+        mesures_reference = (reference or {}).get(echelle, {}).get('mesures', {})
+        for nom, mesure in resultat['mesures'].items():
+            ecart = ''
+            if nom in mesures_reference and mesures_reference[nom]['mediane'] > 0:
+                variation = mesure['mediane'] / mesures_reference[nom]['mediane'] - 1
+                ecart = f"{variation:+.0%}"
+                if variation > seuil:
+                    ecart += ' !'
+                    regressions.append((echelle, nom, variation))
+            lignes.append(f"{nom:<38} {mesure['min'] * 1000:>10.2f} {mesure['mediane'] * 1000:>13.2f} "
+                          f"{mesure['pic_memoire'] / 1024 / 1024:>9.2f} {ecart:>8}")
+    if regressions:
+        lignes.append(f"\n{len(regressions)} régression(s) au-delà de {seuil:.0%} :")
+        lignes.extend(f"  {echelle} {nom}: {variation:+.0%}" for echelle, nom, variation in regressions)
+    return '\n'.join(lignes), regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--echelle', action='append', type=parser_echelle,
+                        help=f"SAISONSxJOUEURSxCLUBS, répétable (défaut {ECHELLE_DEFAUT})")
+    parser.add_argument('--repetitions', type=int, default=5)
+    parser.add_argument('--saison', default='Toutes', help="filtre appliqué aux pages (ex. 2015/16)")
+    parser.add_argument('--position', default='Toutes', help="filtre appliqué aux pages")
+    parser.add_argument('--graine', type=int, default=0)
+    parser.add_argument('--json', help="écrit les mesures dans ce fichier")
+    parser.add_argument('--reference', help="fichier JSON d'une exécution précédente à comparer")
+    parser.add_argument('--seuil', type=float, default=SEUIL_REGRESSION,
+                        help="ralentissement toléré (0.2 = +20%%)")
+    args = parser.parse_args(argv)
+
+    resultats = {}
+    for saisons, joueurs, clubs in args.echelle or [parser_echelle(ECHELLE_DEFAUT)]:
+        echelle = f"{saisons}x{joueurs}x{clubs}"
+        resultats[echelle] = executer(saisons, joueurs, clubs, args.repetitions,
+                                      args.saison, args.position, args.graine)
+
+    reference = None
+    if args.reference:
+        with open(args.reference, encoding='utf-8') as f:
+            reference = json.load(f)['resultats']
+    texte, regressions = formater_rapport(resultats, reference, args.seuil)
+    print(texte)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'parametres': {'repetitions': args.repetitions, 'saison': args.saison,
+                               'position': args.position, 'graine': args.graine,
+                               'pandas': pd.__version__, 'numpy': np.__version__},
+                'resultats': resultats
+            }, f, indent=2, ensure_ascii=False)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""Instrumentation des reruns du dashboard : durées, caches et volume des graphiques
+
+Activée par WYDAD_INSTRUMENTATION=1. Désactivée, chaque point de mesure est un
+contexte vide partagé et les décorateurs renvoient la fonction inchangée : le coût
+est celui d'un appel de fonction.
+
+Chaque rerun collecte ses spans (durées imbriquées), ses accès aux caches et les octets
+des graphiques envoyés. Les rechargements des données en arrière-plan (hors rerun) sont
+comptés avec leur durée et leur dernière erreur. Les totaux sont agrégés dans un registre
+partagé, exporté au format texte Prometheus (prometheus(), ou un serveur HTTP local via
+WYDAD_METRICS_PORT) ; chaque rerun et chaque rechargement est journalisé en une ligne JSON
+sur le logger 'wydad.instrumentation'.
+"""
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ACTIF = os.environ.get('WYDAD_INSTRUMENTATION', '') not in ('', '0')
+# Port du point d'export Prometheus (désactivé si absent)
+METRICS_PORT = int(os.environ.get('WYDAD_METRICS_PORT', 0))
+# Interface d'écoute du point d'export : locale par défaut (0.0.0.0 pour l'exposer au réseau)
+METRICS_HOST = os.environ.get('WYDAD_METRICS_HOST', '127.0.0.1')
+
+logger = logging.getLogger('wydad.instrumentation')
+if ACTIF and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Contexte vide partagé, renvoyé par mesure() quand l'instrumentation est désactivée
+_NUL = contextlib.nullcontext()
+# Rerun en cours : Streamlit exécute le script de chaque session dans son propre thread
+_local = threading.local()
+
+
+class Registre:
+    """Totaux agrégés sur tous les reruns et toutes les sessions du processus"""
+
+    def __init__(self):
+        self.verrou = threading.Lock()
+        self.reruns = 0
+        # nom -> [nombre, durée totale, durée max] (secondes)
+        self.durees = {}
+        # cache -> {'hit': n, 'miss': n}
+        self.caches = {}
+        # graphique -> [envois, octets cumulés]
+        self.octets = {}
+        # Rechargements des données : résultat ('succes' ou 'echec') -> nombre, et dernière
+        # erreur (horodatage, message) ; en_erreur tant que le dernier rechargement a échoué
+        self.rafraichissements = {}
+        self.derniere_erreur = None
+        self.en_erreur = False
+
+    def enregistrer_duree(self, nom, duree):
+        with self.verrou:
+            stats = self.durees.setdefault(nom, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += duree
+            stats[2] = max(stats[2], duree)
+
+    def enregistrer_cache(self, nom, miss):
+        with self.verrou:
+            compteurs = self.caches.setdefault(nom, {'hit': 0, 'miss': 0})
+            compteurs['miss' if miss else 'hit'] += 1
+
+    def enregistrer_octets(self, graphique, octets):
+        with self.verrou:
+            stats = self.octets.setdefault(graphique, [0, 0])
+            stats[0] += 1
+            stats[1] += octets
+
+    def enregistrer_rafraichissement(self, erreur):
+        with self.verrou:
+            resultat = 'succes' if erreur is None else 'echec'
+            self.rafraichissements[resultat] = self.rafraichissements.get(resultat, 0) + 1
+            self.en_erreur = erreur is not None
+            if erreur is not None:
+                self.derniere_erreur = (time.time(), erreur)
+
+    def enregistrer_rerun(self):
+        with self.verrou:
+            self.reruns += 1
+
+    def instantane(self):
+        """Copie cohérente des totaux : {'reruns', 'durees', 'caches', 'octets', 'rafraichissements',
+        'derniere_erreur', 'en_erreur'}"""
+        with self.verrou:
+            return {
+                'reruns': self.reruns,
+                'durees': {nom: list(stats) for nom, stats in self.durees.items()},
+                'caches': {nom: dict(compteurs) for nom, compteurs in self.caches.items()},
+                'octets': {nom: list(stats) for nom, stats in self.octets.items()},
+                'rafraichissements': dict(self.rafraichissements),
+                'derniere_erreur': self.derniere_erreur,
+                'en_erreur': self.en_erreur,
+            }
+
+
+registre = Registre()
+
+
+class Rerun:
+    """Mesures d'un rerun : spans dans l'ordre d'ouverture, accès aux caches et octets par graphique"""
+
+    def __init__(self):
+        self.debut = time.perf_counter()
+        self.duree = None
+        self.niveau = 0
+        self.spans = []
+        self.caches = []
+        self.octets = {}
+
+
+class Span:
+    """Span mesuré : enregistré dans le rerun courant et dans le registre à sa fermeture"""
+    __slots__ = ('nom', 'rerun', 'entree', 'debut')
+
+    def __init__(self, nom):
+        self.nom = nom
+
+    def __enter__(self):
+        self.rerun = getattr(_local, 'rerun', None)
+        self.debut = time.perf_counter()
+        if self.rerun is not None:
+            self.entree = {'span': self.nom, 'niveau': self.rerun.niveau,
+                           'debut_ms': (self.debut - self.rerun.debut) * 1000, 'duree_ms': None}
+            self.rerun.spans.append(self.entree)
+            self.rerun.niveau += 1
+        return self
+
+    def __exit__(self, *exc):
+        duree = time.perf_counter() - self.debut
+        if self.rerun is not None:
+            self.entree['duree_ms'] = duree * 1000
+            self.rerun.niveau -= 1
+        registre.enregistrer_duree(self.nom, duree)
+        return False
+
+
+def mesure(nom):
+    """Contexte mesurant la durée du bloc sous le nom donné"""
+    return Span(nom) if ACTIF else _NUL
+
+
+def demarrer(nom):
+    """Ouvre un span fermé par terminer() (pour un bloc trop long pour un with)"""
+    if not ACTIF:
+        return None
+    span = Span(nom)
+    span.__enter__()
+    return span
+
+
+def terminer(span):
+    if span is not None:
+        span.__exit__(None, None, None)
+
+
+def debut_rerun():
+    """Démarre la collecte d'un rerun complet du script"""
+    if ACTIF:
+        _local.rerun = Rerun()
+
+
+def fin_rerun():
+    """Clôt le rerun courant, le journalise en JSON et le renvoie (None si désactivé)"""
+    rerun = getattr(_local, 'rerun', None)
+    if not ACTIF or rerun is None:
+        return None
+    rerun.duree = time.perf_counter() - rerun.debut
+    registre.enregistrer_duree('rerun', rerun.duree)
+    registre.enregistrer_rerun()
+    logger.info(json.dumps({
+        'evenement': 'rerun',
+        'duree_ms': round(rerun.duree * 1000, 3),
+        'spans': [{**span, 'debut_ms': round(span['debut_ms'], 3),
+                   'duree_ms': None if span['duree_ms'] is None else round(span['duree_ms'], 3)}
+                  for span in rerun.spans],
+        'caches': rerun.caches,
+        'octets': rerun.octets,
+    }, ensure_ascii=False))
+    return rerun
+
+
+def enregistrer_cache(nom, miss):
+    """Compte un accès au cache `nom` (miss=True si la valeur a dû être calculée)"""
+    if not ACTIF:
+        return
+    registre.enregistrer_cache(nom, miss)
+    rerun = getattr(_local, 'rerun', None)
+    if rerun is not None:
+        rerun.caches.append({'cache': nom, 'resultat': 'miss' if miss else 'hit'})
+
+
+def enregistrer_octets(graphique, octets):
+    """Compte les octets de la spec d'un graphique envoyé au navigateur"""
+    if not ACTIF:
+        return
+    registre.enregistrer_octets(graphique, octets)
+    rerun = getattr(_local, 'rerun', None)
+    if rerun is not None:
+        rerun.octets[graphique] = rerun.octets.get(graphique, 0) + octets
+
+
+def enregistrer_rafraichissement(duree, erreur=None):
+    """Compte un rechargement des données (nouvelle version construite, ou échec et son message)
+
+    La durée est enregistrée sous le span 'rafraichissement' ; les étapes mesurées pendant le
+    rechargement ('donnees', 'preparation.*') le sont par leurs propres spans.
+    """
+    if not ACTIF:
+        return
+    registre.enregistrer_duree('rafraichissement', duree)
+    registre.enregistrer_rafraichissement(erreur)
+    logger.info(json.dumps({
+        'evenement': 'rafraichissement',
+        'duree_ms': round(duree * 1000, 3),
+        'resultat': 'succes' if erreur is None else 'echec',
+        'erreur': erreur,
+    }, ensure_ascii=False))
+
+
+def suivre_cache(nom, decorateur_cache):
+    """Applique decorateur_cache (ex. st.cache_resource(...)) en comptant hits et misses
+
+    Un miss est détecté quand la fonction d'origine s'exécute pendant l'appel. Désactivé,
+    renvoie simplement decorateur_cache(fonction).
+    """
+    def decorateur(fonction):
+        if not ACTIF:
+            return decorateur_cache(fonction)
+
+        @functools.wraps(fonction)
+        def calcul(*args, **kwargs):
+            _local.calculs = getattr(_local, 'calculs', 0) + 1
+            return fonction(*args, **kwargs)
+
+        cachee = decorateur_cache(calcul)
+
+        @functools.wraps(fonction)
+        def appel(*args, **kwargs):
+            avant = getattr(_local, 'calculs', 0)
+            with Span(f"cache.{nom}"):
+                resultat = cachee(*args, **kwargs)
+            enregistrer_cache(nom, getattr(_local, 'calculs', 0) > avant)
+            return resultat
+
+        appel.clear = cachee.clear
+        return appel
+    return decorateur
+
+
+def _etiquette(valeur):
+    return str(valeur).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus():
+    """Totaux du registre au format d'exposition texte Prometheus"""
+    totaux = registre.instantane()
+    lignes = [
+        '# TYPE wydad_reruns_total counter',
+        f"wydad_reruns_total {totaux['reruns']}",
+        '# TYPE wydad_span_total counter',
+        '# TYPE wydad_span_secondes_total counter',
+        '# TYPE wydad_span_secondes_max gauge',
+    ]
+    for nom, (nombre, total, maximum) in sorted(totaux['durees'].items()):
+        etiquette = f'{{span="{_etiquette(nom)}"}}'
+        lignes += [f"wydad_span_total{etiquette} {nombre}",
+                   f"wydad_span_secondes_total{etiquette} {total:.6f}",
+                   f"wydad_span_secondes_max{etiquette} {maximum:.6f}"]
+    lignes.append('# TYPE wydad_cache_acces_total counter')
+    for nom, compteurs in sorted(totaux['caches'].items()):
+        for resultat, nombre in sorted(compteurs.items()):
+            lignes.append(f'wydad_cache_acces_total{{cache="{_etiquette(nom)}",resultat="{resultat}"}} {nombre}')
+    lignes += ['# TYPE wydad_graphique_envois_total counter', '# TYPE wydad_graphique_octets_total counter']
+    for nom, (envois, octets) in sorted(totaux['octets'].items()):
+        etiquette = f'{{graphique="{_etiquette(nom)}"}}'
+        lignes += [f"wydad_graphique_envois_total{etiquette} {envois}",
+                   f"wydad_graphique_octets_total{etiquette} {octets}"]
+    lignes.append('# TYPE wydad_rafraichissements_total counter')
+    for resultat, nombre in sorted(totaux['rafraichissements'].items()):
+        lignes.append(f'wydad_rafraichissements_total{{resultat="{resultat}"}} {nombre}')
+    lignes += ['# TYPE wydad_rafraichissement_en_erreur gauge',
+               f"wydad_rafraichissement_en_erreur {int(totaux['en_erreur'])}"]
+    if totaux['derniere_erreur'] is not None:
+        horodatage, erreur = totaux['derniere_erreur']
+        lignes += ['# TYPE wydad_rafraichissement_derniere_erreur_horodatage_secondes gauge',
+                   f'wydad_rafraichissement_derniere_erreur_horodatage_secondes{{erreur="{_etiquette(erreur)}"}} '
+                   f'{horodatage:.3f}']
+    return '\n'.join(lignes) + '\n'
+
+
+class _MetriquesHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') != '/metrics':
+            self.send_error(404)
+            return
+        corps = prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def log_message(self, *args):
+        pass
+
+
+def demarrer_serveur(port=METRICS_PORT, hote=METRICS_HOST):
+    """Sert /metrics sur hote:port dans un thread démon ; renvoie le serveur (None si port=0)"""
+    if not ACTIF or not port:
+        return None
+    serveur = ThreadingHTTPServer((hote, port), _MetriquesHandler)
+    threading.Thread(target=serveur.serve_forever, name='wydad-metrics', daemon=True).start()
+    return serveur